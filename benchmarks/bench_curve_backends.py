@@ -0,0 +1,76 @@
+"""Vergleich Kurven-Backends: direktes Rastern gegen matplotlib + PNG + resize.
+
+Aufruf: python benchmarks/bench_curve_backends.py [--repeat N] [--rows N]
+
+Rendert synthetische 24-Stunden-Reihen über widget_layout.render_curves für
+beide Profile des kleinen und großen Widgets und gibt Laufzeit pro Reihe
+sowie die Pixelabweichung (auf dem hellgrauen Hintergrund) aus.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import widget_layout  # noqa: E402
+from bench_temperature_band import HOURS, synthetic_row  # noqa: E402
+
+BACKGROUND = 211  # lightgrey
+
+
+def synthetic_frame(seed):
+    temperatures, rain, monat = synthetic_row(seed)
+    zeit = pd.date_range(f"2025-{monat:02d}-01", periods=HOURS, freq="h", tz="Europe/Berlin")
+    return pd.DataFrame({"Zeit": zeit, "TTT_x": temperatures, "RR1c_x": rain})
+
+
+def timed(frames, heights, backend, repeat):
+    width = widget_layout.WIDTH_PER_HOUR * HOURS
+    best = float("inf")
+    curves = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        curves = [widget_layout.render_curves(df, width, heights, curve_backend=backend) for df in frames]
+        best = min(best, (time.perf_counter() - start) / len(frames))
+    return best, curves
+
+
+def on_background(img):
+    rgba = np.asarray(img, dtype=np.float64)
+    alpha = rgba[..., 3:] / 255
+    return rgba[..., :3] * alpha + BACKGROUND * (1 - alpha)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=6)
+    args = parser.parse_args()
+
+    width = widget_layout.WIDTH_PER_HOUR * HOURS
+    heights = {widget_layout.profile_height(p, width) for p in (widget_layout.LARGE, widget_layout.SMALL)}
+    frames = [synthetic_frame(seed) for seed in range(args.rows)]
+    for backend in widget_layout.CURVE_BACKENDS:  # Aufwärmen (Fonts, Colormaps, scipy)
+        widget_layout.render_curves(frames[0], width, heights, curve_backend=backend)
+
+    t_reference, reference = timed(frames, heights, "matplotlib", args.repeat)
+    t_raster, raster = timed(frames, heights, "raster", args.repeat)
+
+    print(f"matplotlib + PNG + resize: {t_reference * 1000:8.1f} ms/Reihe")
+    print(f"direkt gerastert:          {t_raster * 1000:8.1f} ms/Reihe")
+    print(f"Beschleunigung:            {t_reference / t_raster:8.1f}x")
+
+    for seed, (a, b) in enumerate(zip(reference, raster)):
+        for height in sorted(heights):
+            diff = np.abs(on_background(a[height]) - on_background(b[height])).max(axis=2)
+            print(f"Reihe {seed}, Höhe {height}: max. Abweichung {diff.max():5.1f}, mittel {diff.mean():.3f}, "
+                  f"Pixel > 16: {(diff > 16).mean() * 100:.2f} %")
+
+
+if __name__ == "__main__":
+    main()
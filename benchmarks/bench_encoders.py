@@ -0,0 +1,67 @@
+"""Vergleich der Ausgabeformate für die Widgets: Bytes gegen Kodierzeit.
+
+Aufruf: python benchmarks/bench_encoders.py [Bilder ...] [--encoders SPEC ...] [--repeat N]
+
+Ohne Bilder werden alle "Wettervorhersage*.png" im Projektverzeichnis
+verwendet. Pro Format werden Gesamtgröße, Größe als base64 (so landet das
+große Widget in map_wettervorhersage.html), Kodierzeit und die maximale
+Pixelabweichung gegenüber dem Original ausgegeben.
+"""
+import argparse
+import sys
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import widget_encode  # noqa: E402
+
+DEFAULT_SPECS = [
+    "png", "png:1", "png:9", "png-optimize", "png-palette",
+    "webp-lossless:0", "webp-lossless:4", "webp-lossless:6",
+    "webp:75", "webp:85", "webp:95",
+]
+
+
+def max_deviation(original, data):
+    decoded = np.asarray(Image.open(BytesIO(data)).convert("RGBA"), dtype=np.int16)
+    return int(np.abs(np.asarray(original, dtype=np.int16) - decoded).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("images", nargs="*", type=Path)
+    parser.add_argument("--encoders", nargs="+", default=DEFAULT_SPECS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = args.images or sorted(Path(__file__).resolve().parent.parent.glob("Wettervorhersage*.png"))
+    if not paths:
+        parser.error("keine Bilder gefunden")
+    images = [Image.open(p).convert("RGBA") for p in paths]
+    original_bytes = sum(p.stat().st_size for p in paths)
+    print(f"{len(images)} Bilder, Original {original_bytes / 1024:.1f} KB\n")
+    print(f"{'Format':<18} {'KB':>8} {'base64 KB':>10} {'ms/Bild':>8} {'max. Abw.':>10}")
+
+    for spec in args.encoders:
+        encoder = widget_encode.encoder_from_spec(spec)
+        size = 0
+        seconds = 0.0
+        deviation = 0
+        for img in images:
+            best = None
+            for _ in range(args.repeat):
+                data, result = widget_encode.encode(img, encoder)
+                best = result if best is None or result.seconds < best.seconds else best
+            size += best.size
+            seconds += best.seconds
+            deviation = max(deviation, max_deviation(img, data))
+        base64_size = (size + 2) // 3 * 4
+        print(f"{spec:<18} {size / 1024:8.1f} {base64_size / 1024:10.1f} "
+              f"{seconds / len(images) * 1000:8.1f} {deviation:10d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""Laufzeit der einzelnen Pipeline-Stufen auf synthetischen DWD-Dateien, mit JSON-Baselines.
+
+Aufruf: python benchmarks/bench_pipeline.py [--stations N] [--steps N] [--repeat N]
+            [--stages NAME ...] [--save DATEI] [--compare DATEI] [--threshold ANTEIL]
+
+Erzeugt die Fixtures (benchmarks/fixtures.py) in einem temporären
+Verzeichnis und misst jede Stufe getrennt, nach einem Aufwärmdurchlauf
+repeat-mal; berichtet werden Minimum und Median pro Einheit (Station,
+Widget-Reihe, Datei). --save schreibt das Ergebnis als JSON-Baseline,
+--compare vergleicht mit einer Baseline und beendet sich mit Code 1, wenn
+eine Stufe im Median um mehr als --threshold langsamer geworden ist.
+Stufen, deren Abhängigkeiten fehlen (z.B. xarray für die GRIB-Stufe),
+werden übersprungen und als solche vermerkt.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import fixtures  # noqa: E402
+
+# Stationen, für die die Stufen nach dem Ingest pro Station gemessen werden
+BENCH_STATIONS = 6
+
+# Unterhalb dieser Differenz (Sekunden pro Einheit) gilt eine Stufe nie als Regression
+MIN_DELTA = 0.0005
+
+
+@contextmanager
+def _cwd(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def _placeholder_icons(icon_dir):
+    # widget_layout braucht die Icons aus icons/; fehlen sie im Checkout, Platzhalter verwenden
+    import widget_layout
+    from PIL import Image, ImageDraw
+
+    if all(path.exists() for path in widget_layout.ICON_PATHS.values()):
+        return
+    icon_dir.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    for key, path in widget_layout.ICON_PATHS.items():
+        img = Image.new("RGBA", (64, 64), (0, 0, 0, 0))
+        ImageDraw.Draw(img).polygon([(4, 24), (44, 24), (44, 8), (60, 32), (44, 56), (44, 40), (4, 40)],
+                                    fill=(60, 100, 200, 255))
+        img.save(icon_dir / path.name)
+        paths[key] = icon_dir / path.name
+    widget_layout.ICON_PATHS = paths
+
+
+class Context:
+    # Fixtures und Zwischenergebnisse, die die Stufen voneinander übernehmen
+
+    def __init__(self, work_dir, num_stations, num_steps, grib_steps):
+        self.work_dir = Path(work_dir)
+        self.num_stations = num_stations
+        self.num_steps = num_steps
+        self.grib_steps = grib_steps
+        self.s_path, self.l_paths = fixtures.write_mosmix(self.work_dir / "fixtures", num_stations, num_steps,
+                                                          l_stations=BENCH_STATIONS)
+        self.station_ids = list(self.l_paths)
+        self._ingests = 0
+
+    def store_dir(self):
+        # Jeder Ingest in ein neues Verzeichnis, sonst bricht er nach dem Kopf ab
+        self._ingests += 1
+        return self.work_dir / f"store-{self._ingests}"
+
+
+# Stufen: Name → (Vorbereitung(ctx) → (Funktion ohne Argumente, Einheiten pro Aufruf, Einheit))
+
+def stage_ingest_mosmix_s(ctx):
+    import mosmix_store
+
+    def run():
+        mosmix_store.ingest_kmz(ctx.s_path, "MOSMIX_S", store_dir=ctx.store_dir())
+    return run, ctx.num_stations, "Station"
+
+
+def _mosmix_s_run(ctx):
+    import mosmix_store
+
+    if not hasattr(ctx, "run_s"):
+        ctx.run_s = mosmix_store.open_run(mosmix_store.ingest_kmz(ctx.s_path, "MOSMIX_S", store_dir=ctx.store_dir()))
+        ctx.runs_l = {
+            station_id: mosmix_store.open_run(mosmix_store.ingest_kmz(path, f"MOSMIX_L_{station_id}",
+                                                                      store_dir=ctx.store_dir()))
+            for station_id, path in ctx.l_paths.items()
+        }
+    return ctx.run_s
+
+
+def stage_parse_mosmix_s(ctx):
+    import main48
+
+    run_s = _mosmix_s_run(ctx)
+
+    def run():
+        for station_id in ctx.station_ids:
+            main48.parse_kml_forecast_for_station_mosmix_s(run_s, station_id)
+    return run, len(ctx.station_ids), "Station"
+
+
+def stage_parse_mosmix_l(ctx):
+    import main48
+
+    _mosmix_s_run(ctx)
+
+    def run():
+        for station_id in ctx.station_ids:
+            main48.parse_kml_forecast_mosmix_l(ctx.runs_l[station_id])
+    return run, len(ctx.station_ids), "Station"
+
+
+def _frames(ctx):
+    # Eingaben von merge_asof wie in main48.merge_forecasts
+    import main48
+
+    if not hasattr(ctx, "frames"):
+        run_s = _mosmix_s_run(ctx)
+        ctx.frames = []
+        for station_id in ctx.station_ids:
+            df_s = main48.parse_kml_forecast_for_station_mosmix_s(run_s, station_id)[0]
+            df_l = main48.parse_kml_forecast_mosmix_l(ctx.runs_l[station_id])
+            df_l.loc[:, 'wwT'] = df_l['wwT'].fillna(0)
+            ctx.frames.append((df_s, df_l))
+    return ctx.frames
+
+
+def stage_merge_asof(ctx):
+    import pandas as pd
+
+    frames = _frames(ctx)
+
+    def run():
+        for df_s, df_l in frames:
+            pd.merge_asof(df_s.sort_values("Zeit"), df_l.sort_values("Zeit"), on="Zeit", direction="nearest")
+    return run, len(frames), "Station"
+
+
+def _rows(ctx):
+    # (df_1, df_2, Sonnenzeiten) je Station
+    import main48
+    import sun_table
+
+    if not hasattr(ctx, "rows"):
+        run_s = _mosmix_s_run(ctx)
+        # wie main48.sun_times_for_run, aber ohne die Tabelle unter data/ abzulegen
+        first_day = datetime.fromisoformat(run_s.time_steps[0].replace("Z", "+00:00")).astimezone(main48.BERLIN).date()
+        sun_times = sun_table.build(run_s.stations, first_day, 3)
+        ctx.rows = [main48.merge_forecasts(df_s, ctx.runs_l[station_id]) + (sun_times.station(station_id),)
+                    for station_id, (df_s, _) in zip(ctx.station_ids, _frames(ctx))]
+        _placeholder_icons(ctx.work_dir / "icons")
+    return ctx.rows
+
+
+def _stage_curve(ctx, backend):
+    import widget_layout
+
+    rows = _rows(ctx)
+    width = widget_layout.WIDTH_PER_HOUR * 24
+    heights = {widget_layout.profile_height(p, width) for p in (widget_layout.LARGE, widget_layout.SMALL)}
+
+    def run():
+        for df_1, df_2, _ in rows:
+            widget_layout.render_curves(df_1, width, heights, curve_backend=backend)
+            widget_layout.render_curves(df_2, width, heights, curve_backend=backend)
+    return run, 2 * len(rows), "Reihe"
+
+
+def stage_curve_raster(ctx):
+    return _stage_curve(ctx, "raster")
+
+
+def stage_curve_matplotlib(ctx):
+    return _stage_curve(ctx, "matplotlib")
+
+
+def stage_annotations(ctx):
+    # Beschriftungen, Icons, Pfeile und Tortendiagramme: Layout plus Rastern auf die fertige Kurve
+    import widget_layout
+
+    rows = _rows(ctx)
+    width = widget_layout.WIDTH_PER_HOUR * 24
+    profiles = (widget_layout.LARGE, widget_layout.SMALL)
+    heights = {widget_layout.profile_height(p, width) for p in profiles}
+    curves = [(df, sun, widget_layout.render_curves(df, width, heights)) for df_1, df_2, sun in rows for df in (df_1, df_2)]
+
+    def run():
+        for df, sun, curve in curves:
+            ops = widget_layout.layout_row(df, sun)
+            for profile in profiles:
+                widget_layout.rasterize(ops, curve[widget_layout.profile_height(profile, width)], width, profile)
+    return run, len(curves), "Reihe"
+
+
+def stage_render_widgets(ctx):
+    import widget_layout
+
+    rows = _rows(ctx)
+
+    def run():
+        for df_1, df_2, sun in rows:
+            widget_layout.render_widgets(df_1, df_2, sun)
+    return run, len(rows), "Station"
+
+
+def stage_encode(ctx):
+    import widget_encode
+    import widget_layout
+
+    rows = _rows(ctx)
+    widgets = [img for df_1, df_2, sun in rows for img in widget_layout.render_widgets(df_1, df_2, sun)]
+    encoder = widget_encode.encoder_from_spec()
+
+    def run():
+        for img in widgets:
+            widget_encode.encode(img, encoder)
+    return run, len(widgets), "Bild"
+
+
+def stage_build_summary(ctx):
+    import create_widget_info
+
+    station_id = ctx.station_ids[-1]
+    with create_widget_info.open_kml(ctx.s_path) as kml_stream:
+        time_steps, forecasts, name, description = create_widget_info.parse_kml(kml_stream, station_id)
+
+    def run():
+        create_widget_info.build_summary(time_steps, forecasts, name, description)
+    return run, 1, "Station"
+
+
+def stage_grib_crop_write(ctx):
+    import dwd_download
+    import process_dwd_uv_and_pt
+
+    grib_dir = ctx.work_dir / "grib"
+    paths = fixtures.write_grib_like(grib_dir, ctx.grib_steps)
+    results = {typ: dwd_download.FetchResult(str(path), path, True, 200) for typ, path in paths.items()}
+    open_dataset = process_dwd_uv_and_pt.xr.open_dataset
+    download_all_dwd_types = process_dwd_uv_and_pt.download_all_dwd_types
+    out_dir = ctx.work_dir / "grib-out"
+    (out_dir / "docs" / "data").mkdir(parents=True, exist_ok=True)
+
+    def run():
+        # Fixtures sind NetCDF: engine='cfgrib' für die Messung auf den Standard umlenken
+        process_dwd_uv_and_pt.download_all_dwd_types = lambda target_folder, date=None: results
+        process_dwd_uv_and_pt.xr.open_dataset = lambda path, engine=None, **kw: open_dataset(path, **kw)
+        try:
+            with _cwd(out_dir):
+                process_dwd_uv_and_pt.main([])
+        finally:
+            process_dwd_uv_and_pt.xr.open_dataset = open_dataset
+            process_dwd_uv_and_pt.download_all_dwd_types = download_all_dwd_types
+    return run, 1, "Lauf"
+
+
+STAGES = {
+    "ingest_mosmix_s": stage_ingest_mosmix_s,
+    "parse_mosmix_s": stage_parse_mosmix_s,
+    "parse_mosmix_l": stage_parse_mosmix_l,
+    "merge_asof": stage_merge_asof,
+    "curve_raster": stage_curve_raster,
+    "curve_matplotlib": stage_curve_matplotlib,
+    "annotations": stage_annotations,
+    "render_widgets": stage_render_widgets,
+    "encode": stage_encode,
+    "build_summary": stage_build_summary,
+    "grib_crop_write": stage_grib_crop_write,
+}
+
+
+def measure(run, repeat):
+    run()  # Aufwärmen
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_stages(ctx, names, repeat):
+    results = {}
+    for name in names:
+        try:
+            run, units, unit = STAGES[name](ctx)
+        except ImportError as e:
+            print(f"{name:<18} übersprungen ({e})")
+            results[name] = {"skipped": str(e)}
+            continue
+        times = [t / units for t in measure(run, repeat)]
+        results[name] = {"unit": unit, "units": units, "min": min(times), "median": statistics.median(times)}
+        print(f"{name:<18} {results[name]['min'] * 1000:10.2f} {results[name]['median'] * 1000:10.2f}  ms/{unit}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Liefert die Namen der Stufen, die langsamer als Baseline * (1 + threshold) sind
+    regressions = []
+    print(f"\n{'Stufe':<18} {'Baseline':>10} {'jetzt':>10} {'Faktor':>8}")
+    for name, current in results.items():
+        before = baseline.get("stages", {}).get(name)
+        if "median" not in current or not before or "median" not in before:
+            continue
+        ratio = current["median"] / before["median"]
+        regressed = ratio > 1 + threshold and current["median"] - before["median"] > MIN_DELTA
+        print(f"{name:<18} {before['median'] * 1000:10.2f} {current['median'] * 1000:10.2f} {ratio:8.2f}"
+              f"{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", type=int, default=500, help="Stationen in MOSMIX_S")
+    parser.add_argument("--steps", type=int, default=247, help="Zeitschritte in MOSMIX_S/L")
+    parser.add_argument("--grib-steps", type=int, default=6, help="Zeitschritte im GFT-Gitter")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--save", type=Path, help="Ergebnis als JSON-Baseline schreiben")
+    parser.add_argument("--compare", type=Path, help="mit dieser JSON-Baseline vergleichen")
+    parser.add_argument("--threshold", type=float, default=0.2, help="erlaubte Verlangsamung im Median (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        fixture = baseline.get("fixture", {})
+        if fixture.get("stations") != args.stations or fixture.get("steps") != args.steps:
+            print(f"Warnung: Baseline mit {fixture.get('stations')} Stationen × {fixture.get('steps')} Zeitschritten, "
+                  f"jetzt {args.stations} × {args.steps}")
+
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline-") as work_dir:
+        start = time.perf_counter()
+        ctx = Context(work_dir, args.stations, args.steps, args.grib_steps)
+        print(f"Fixtures: {args.stations} Stationen × {args.steps} Zeitschritte in {time.perf_counter() - start:.1f} s\n")
+        print(f"{'Stufe':<18} {'min':>10} {'Median':>10}")
+        results = run_stages(ctx, args.stages, args.repeat)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "fixture": {"stations": args.stations, "steps": args.steps, "grib_steps": args.grib_steps},
+        "repeat": args.repeat,
+        "stages": results,
+    }
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        print(f"\nBaseline nach {args.save} geschrieben")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} Stufe(n) langsamer als erlaubt: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Vergleich Temperaturfläche: eine PolyCollection gegen ~500 fill_between.
+
+Aufruf: python benchmarks/bench_temperature_band.py [--repeat N] [--rows N]
+
+Rendert synthetische 24-Stunden-Reihen mit beiden Varianten über
+widget_render.render_curve, skaliert wie main48.py auf die Zielgröße und
+gibt Laufzeit pro Bild sowie die Pixelabweichung aus.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import widget_render  # noqa: E402
+
+WIDTH_PER_HOUR = 50
+HOURS = 24
+
+
+def synthetic_row(seed):
+    rng = np.random.default_rng(seed)
+    hours = np.arange(HOURS)
+    temperatures = np.round(8 + 7 * np.sin((hours - 9) / 24 * 2 * np.pi) + rng.normal(0, 1.5, HOURS)).astype(int)
+    rain = np.round(rng.choice([0, 0, 0, 0, 0.3, 1.2, 4.5], HOURS), 1)
+    monat = int(rng.integers(1, 13))
+    return temperatures, rain, monat
+
+
+def render(row, band_renderer):
+    temperatures, rain, monat = row
+    width = WIDTH_PER_HOUR * HOURS
+    height = int((width / 360) * 188)
+    curve_img = widget_render.render_curve(temperatures, rain, monat, width, height, WIDTH_PER_HOUR,
+                                           band_renderer=band_renderer)
+    return curve_img.resize((width, height // 2), Image.Resampling.LANCZOS)
+
+
+def timed(rows, band_renderer, repeat):
+    best = float("inf")
+    images = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        images = [render(row, band_renderer) for row in rows]
+        best = min(best, (time.perf_counter() - start) / len(rows))
+    return best, images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=6)
+    args = parser.parse_args()
+
+    rows = [synthetic_row(seed) for seed in range(args.rows)]
+    render(rows[0], widget_render.draw_temperature_band)  # Aufwärmen (Fonts, Colormaps)
+
+    t_segments, reference = timed(rows, widget_render.draw_temperature_band_segments, args.repeat)
+    t_batched, batched = timed(rows, widget_render.draw_temperature_band, args.repeat)
+
+    print(f"fill_between je Segment: {t_segments * 1000:8.1f} ms/Bild")
+    print(f"PolyCollection:          {t_batched * 1000:8.1f} ms/Bild")
+    print(f"Beschleunigung:          {t_segments / t_batched:8.1f}x")
+
+    for seed, (a, b) in enumerate(zip(reference, batched)):
+        diff = np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16)).max(axis=2)
+        print(f"Reihe {seed}: max. Abweichung {diff.max():3d}, mittel {diff.mean():.3f}, "
+              f"Pixel > 16: {(diff > 16).mean() * 100:.2f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Synthetische DWD-Dateien für die Benchmarks, ohne Netz.
+
+Aufruf: python benchmarks/fixtures.py ZIEL [--stations N] [--steps N] [--l-stations N] [--grib-steps N]
+
+Schreibt MOSMIX_S (alle Stationen) und MOSMIX_L (einzelne Stationen) als
+KMZ im Format der DWD-KML sowie kleine GRIB-ähnliche Gitter für
+process_dwd_uv_and_pt (NetCDF mit denselben Variablen, Koordinaten und dem
+ICON-EU-Gitter wie die cfgrib-Datasets; braucht xarray). Die Werte sind
+zufällig, aber plausibel; pro Element wird ein Vorrat an Wertezeilen
+vorformatiert und auf die Stationen verteilt, damit auch große Dateien in
+Sekunden entstehen.
+"""
+import argparse
+import zipfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+ISSUE_TIME = datetime(2025, 10, 18, 9, tzinfo=timezone.utc)
+
+ELEMENTS_S = ["PPPP", "TX", "TTT", "Td", "TN", "TG", "DD", "FF", "FX1", "FX3", "FXh", "FXh25", "FXh40",
+              "FXh55", "N", "Neff", "Nh", "Nm", "Nl", "N05", "VV", "wwM", "wwM6", "wwMh", "ww", "W1W2",
+              "RR1c", "RRS1c", "RR3c", "RRS3c", "R602", "R650", "Rh00", "Rh02", "Rh10", "Rh50", "Rd02",
+              "Rd10", "Rd50", "Rad1h", "SunD1"]
+ELEMENTS_L = ["TTT", "DD", "FF", "FX1", "ww", "Neff", "VV", "RR1c", "wwP", "wwT", "DRR1"]
+
+# Zeilen pro Element, aus denen die Stationen ihre Werte ziehen
+VALUE_POOL = 32
+
+# Ausschnitt Deutschland für die Stationskoordinaten (lon, lat)
+BBOX = (5.9, 47.3, 15.0, 55.0)
+
+# ICON-EU-Gitter der Gesundheitsvorhersage (aufsteigend wie im cfgrib-Dataset)
+GRID_LATITUDES = (29.5, 70.5)
+GRID_LONGITUDES = (-23.5, 62.5)
+GRID_STEP = 0.0625
+GRIB_VARIABLES = {"gft": "PT1M", "uvi": "UVI_MAX_CL", "uvh": "UVI_MAX_H"}
+
+
+def _element_values(element, rng, size):
+    if element in ("TTT", "Td", "TX", "TN", "TG"):
+        return rng.uniform(265, 300, size)
+    if element == "DD":
+        return rng.integers(0, 360, size).astype(float)
+    if element.startswith("FX") or element == "FF":
+        return rng.uniform(0, 15, size)
+    if element == "PPPP":
+        return rng.uniform(98000, 103000, size)
+    if element in ("ww", "wwM", "wwM6", "wwMh"):
+        return rng.choice([0, 1, 2, 3, 45, 61, 63, 71, 81, 95], size).astype(float)
+    if element == "VV":
+        return rng.choice([5000, 30000, 95000, 130000], size).astype(float)
+    if element.startswith("RR"):
+        return rng.choice([0, 0, 0, 0, 0.3, 1.2, 4.5], size)
+    if element == "DRR1":
+        return rng.choice([0, 600, 1800, 3600], size).astype(float)
+    return rng.uniform(0, 100, size)
+
+
+def _value_pool(elements, num_steps, rng):
+    # dict Element → Liste vorformatierter <dwd:value>-Inhalte; bei den Elementen,
+    # die die Widgets nicht brauchen, fehlt ein Teil der Zeitschritte wie beim DWD ('-')
+    pool = {}
+    for element in elements:
+        rows = []
+        for _ in range(VALUE_POOL):
+            values = [f"{v:.2f}" for v in _element_values(element, rng, num_steps)]
+            if element not in ELEMENTS_L:
+                for i in np.flatnonzero(rng.random(num_steps) < 0.1):
+                    values[i] = "-"
+            rows.append("     " + "     ".join(values))
+        pool[element] = rows
+    return pool
+
+
+def station_ids(num_stations):
+    return [f"{10000 + i:05d}" for i in range(num_stations)]
+
+
+def iter_kml(num_stations, num_steps, elements=ELEMENTS_S, seed=0, issue_time=ISSUE_TIME, first_station=0):
+    # KML-Text in Stücken (Kopf, dann ein Placemark pro Stück)
+    rng = np.random.default_rng(seed)
+    pool = _value_pool(elements, num_steps, rng)
+    yield ('<?xml version="1.0" encoding="ISO-8859-1" standalone="yes"?>\n'
+           '<kml:kml xmlns:dwd="https://opendata.dwd.de/weather/lib/pointforecast_dwd_extension_V1_0.xsd" '
+           'xmlns:gx="http://www.google.com/kml/ext/2.2" xmlns:kml="http://www.opengis.net/kml/2.2">\n'
+           '<kml:Document>\n<kml:ExtendedData>\n<dwd:ProductDefinition>\n'
+           '<dwd:Issuer>Deutscher Wetterdienst</dwd:Issuer>\n<dwd:ProductID>MOSMIX</dwd:ProductID>\n'
+           f'<dwd:IssueTime>{issue_time.strftime("%Y-%m-%dT%H:%M:%S.000Z")}</dwd:IssueTime>\n'
+           '<dwd:ForecastTimeSteps>\n')
+    yield "".join(f'<dwd:TimeStep>{(issue_time + timedelta(hours=i + 1)).strftime("%Y-%m-%dT%H:%M:%S.000Z")}</dwd:TimeStep>\n'
+                  for i in range(num_steps))
+    yield '</dwd:ForecastTimeSteps>\n</dwd:ProductDefinition>\n</kml:ExtendedData>\n'
+
+    lon_min, lat_min, lon_max, lat_max = BBOX
+    ids = station_ids(first_station + num_stations)[first_station:]
+    for station_id in ids:
+        forecasts = "".join(
+            f'<dwd:Forecast dwd:elementName="{element}">\n'
+            f'<dwd:value>{pool[element][rng.integers(VALUE_POOL)]}</dwd:value>\n</dwd:Forecast>\n'
+            for element in elements
+        )
+        yield (f'<kml:Placemark>\n<kml:name>{station_id}</kml:name>\n'
+               f'<kml:description>STATION {station_id}</kml:description>\n'
+               f'<kml:ExtendedData>\n{forecasts}</kml:ExtendedData>\n'
+               f'<kml:Point>\n<kml:coordinates>{rng.uniform(lon_min, lon_max):.2f},'
+               f'{rng.uniform(lat_min, lat_max):.2f},{rng.uniform(0, 900):.1f}</kml:coordinates>\n'
+               '</kml:Point>\n</kml:Placemark>\n')
+    yield '</kml:Document>\n</kml:kml>\n'
+
+
+def write_kmz(path, chunks, member="MOSMIX.kml"):
+    # KML stückweise komprimiert schreiben, ohne die ganze Datei im Speicher
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as kmz, kmz.open(member, "w") as f:
+        for chunk in chunks:
+            f.write(chunk.encode("iso-8859-1"))
+    return path
+
+
+def write_mosmix(out_dir, num_stations=100, num_steps=247, l_stations=6, seed=0, issue_time=ISSUE_TIME):
+    # MOSMIX_S mit num_stations Stationen, MOSMIX_L (240 h) für die ersten l_stations.
+    # Liefert (Pfad MOSMIX_S, dict Stations-ID → Pfad MOSMIX_L)
+    out_dir = Path(out_dir)
+    s_path = write_kmz(out_dir / "MOSMIX_S_LATEST_240.kmz",
+                       iter_kml(num_stations, num_steps, ELEMENTS_S, seed=seed, issue_time=issue_time))
+    l_paths = {}
+    for i, station_id in enumerate(station_ids(min(l_stations, num_stations))):
+        l_paths[station_id] = write_kmz(
+            out_dir / f"MOSMIX_L_LATEST_{station_id}.kmz",
+            iter_kml(1, num_steps, ELEMENTS_L, seed=seed + 1000 + i, issue_time=issue_time, first_station=i))
+    return s_path, l_paths
+
+
+def grid_coordinates():
+    latitudes = np.arange(GRID_LATITUDES[0], GRID_LATITUDES[1] + GRID_STEP / 2, GRID_STEP)
+    longitudes = np.arange(GRID_LONGITUDES[0], GRID_LONGITUDES[1] + GRID_STEP / 2, GRID_STEP)
+    return latitudes, longitudes
+
+
+def _grid_values(typ, rng, shape):
+    # Glatte Felder wie beim DWD (sonst wären Kompressionsraten unrealistisch schlecht):
+    # gefühlte Temperatur in Kelvin, UV-Index 0..9, Stunde des UV-Maximums 10..14
+    steps, nlat, nlon = shape
+    y = np.linspace(0, 1, nlat)[:, None]
+    x = np.linspace(0, 1, nlon)[None, :]
+    fields = []
+    for _ in range(steps):
+        phase = rng.uniform(0, 2 * np.pi, 2)
+        wave = np.sin(6 * x + phase[0]) * np.cos(4 * y + phase[1])
+        if typ == "gft":
+            field = 300 - 35 * y + 8 * wave + rng.normal(0, 0.3, shape[1:])
+        elif typ == "uvi":
+            field = np.clip(9 * (1 - y) + 1.5 * wave, 0, None)
+        else:
+            field = np.round(12 + 2 * wave)
+        fields.append(field)
+    return np.array(fields, dtype=np.float32)
+
+
+def write_grib_like(out_dir, gft_steps=6, uv_days=3, seed=0, issue_time=ISSUE_TIME):
+    # NetCDF-Dateien mit den Variablen der drei DWD-GRIBs; dict Typ → Pfad
+    import xarray as xr
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    latitudes, longitudes = grid_coordinates()
+    start = np.datetime64(issue_time.replace(hour=0, tzinfo=None), "ns")
+    steps = {
+        "gft": np.arange(1, gft_steps + 1) * np.timedelta64(1, "h"),
+        "uvi": np.arange(uv_days) * np.timedelta64(1, "D"),
+        "uvh": np.arange(uv_days) * np.timedelta64(1, "D"),
+    }
+    paths = {}
+    for typ, variable in GRIB_VARIABLES.items():
+        step = steps[typ].astype("timedelta64[ns]")
+        values = _grid_values(typ, rng, (len(step), len(latitudes), len(longitudes)))
+        ds = xr.Dataset(
+            {variable: (("step", "latitude", "longitude"), values)},
+            coords={"step": step, "latitude": latitudes, "longitude": longitudes,
+                    "time": start, "valid_time": ("step", start + step)},
+        )
+        paths[typ] = out_dir / f"icreu_{typ}.nc"
+        ds.to_netcdf(paths[typ])
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--stations", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=247)
+    parser.add_argument("--l-stations", type=int, default=6)
+    parser.add_argument("--grib-steps", type=int, default=6, help="Zeitschritte im GFT-Gitter, 0: keine GRIB-Fixtures")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    s_path, l_paths = write_mosmix(args.out_dir, args.stations, args.steps, args.l_stations, seed=args.seed)
+    print(f"{s_path} ({s_path.stat().st_size / 1024:.0f} KB), {len(l_paths)} MOSMIX_L-Dateien")
+    if args.grib_steps:
+        for typ, path in write_grib_like(args.out_dir, args.grib_steps, seed=args.seed).items():
+            print(f"{path} ({path.stat().st_size / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
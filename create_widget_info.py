@@ -1,11 +1,17 @@
-import requests
-import zipfile
-import io
-import xml.etree.ElementTree as ET
+import argparse
 import json
-from datetime import datetime, timedelta, timezone
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
 from zoneinfo import ZoneInfo
-from datetime import datetime
+import numpy as np
+import dwd_download
+import instrumentation
+import mosmix_kml
+import station_index
 
 def log(msg):
     print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
@@ -14,6 +20,31 @@ def log(msg):
 # ------------------ Konfiguration ------------------
 target_station_name = "ASCHHEIM"  # Beispiel: ASCHHEIM P755 MUENCHEN STADT 10865
 BASE_URL = f"https://opendata.dwd.de/weather/local_forecasts/mos/MOSMIX_S/all_stations/kml/MOSMIX_S_LATEST_240.kmz"
+SUMMARY_FILE = "docs/data/weather-summary.json"
+
+# Batch-Modus: eine Zusammenfassung pro Station plus Manifest für die Landing Page.
+# Die Landing Page zeigt MOSMIX_L (Diagramme, Fehlerbänder, Tageskarten); die Shards
+# enthalten darum dieselben Daten aus der MOSMIX_L-Datei aller Stationen, damit die
+# Seite keine KMZ mehr laden und parsen muss
+BATCH_URL = "https://opendata.dwd.de/weather/local_forecasts/mos/MOSMIX_L/all_stations/kml/MOSMIX_L_LATEST.kmz"
+SHARD_DIR = "docs/data/summaries"
+MANIFEST_FILE = "manifest.json"
+SUMMARY_ELEMENTS = ("ww", "TTT", "RR1c", "Neff")  # mehr braucht build_summary nicht
+# Spiegel von excludedElements in docs/Landing page.html: Elemente, die die Seite
+# nie zeigt, kommen nicht in die Shards (außer denen für build_summary)
+PAGE_EXCLUDED_ELEMENTS = frozenset([
+    "E_PPP", "E_Td", "FX3", "FX625", "FX640", "FX655", "FXh", "FXh25", "FXh40",
+    "PSd00", "PSd30", "PSd60", "R101", "R102", "R103", "R105", "R107", "R110",
+    "R120", "R130", "R150", "R600", "R602", "R610", "R650", "RRad1", "Rd00",
+    "Rd02", "Rd10", "Rd50", "Rh00", "Rh02", "Rh10", "Rh50", "RR1o1", "RR1u1",
+    "RR1w1", "RR3c", "RR6c", "RRdc", "RRhc", "RRL1c", "RRS1c", "RRS3c", "RSunD",
+    "SunD3", "T5cm", "Td", "TG", "TM", "W1W2", "WPc11", "WPc31", "WPc61", "DRR1",
+    "WPcd1", "WPch1", "ww", "ww3", "wwC", "wwC6", "wwCh", "wwD", "wwD6", "wwDh",
+    "wwF", "wwF6", "wwFh", "wwL", "wwL6", "wwLh", "wwM6", "wwMd", "wwMh", "wwP6",
+    "wwPd", "wwPh", "wwS", "wwS6", "wwSh", "wwT6", "wwTd", "wwTh", "wwZ", "VV10",
+    "wwZ6", "wwZh", "FXh55", "N05", "Nh", "Nl", "Nlm", "Nm", "PEvap", "TX", "TN", "N",
+])
+SHARD_BATCH_SIZE = 64
 
 PERIODS = [
     {"name": "Früh", "startHour": 6, "endHour": 10},
@@ -80,198 +111,295 @@ WW_ICON_MAP_NIGHT = {
 }
 
 
+@instrumentation.timed("download")
 def load_kmz(url):
-    r = requests.get(url)
-    r.raise_for_status()
-    z = zipfile.ZipFile(io.BytesIO(r.content))
-    kml_file = [f for f in z.namelist() if f.endswith(".kml")][0]
-    return z.read(kml_file).decode("iso-8859-1")
+    # Bedingter Download über den lokalen Cache; die KML wird beim Parsen
+    # direkt aus der zwischengespeicherten KMZ gestreamt
+    return dwd_download.fetch(url)
 
 
-def parse_kml(kml_text):
-    DWDNS = "{https://opendata.dwd.de/weather/lib/pointforecast_dwd_extension_V1_0.xsd}"
-    xml_root = ET.fromstring(kml_text)
-    timeSteps = [t.text.strip() for t in xml_root.findall(f".//{DWDNS}TimeStep")]
-    ns = {"kml": "http://www.opengis.net/kml/2.2"}
+@contextmanager
+def open_kml(kmz, url=BASE_URL):
+    # kmz: Pfad der zwischengespeicherten KMZ; None streamt die KML von url direkt
+    # aus der HTTP-Antwort in den Parser (nichts auf der Platte, kein Komplettpuffer)
+    if kmz is None:
+        with dwd_download.open_stream(url) as raw, mosmix_kml.open_kml_member(raw) as kml_stream:
+            yield kml_stream
+    else:
+        with mosmix_kml.open_kml_member(kmz) as kml_stream:
+            yield kml_stream
 
-    target_placemark = None
-    for placemark in xml_root.findall(".//kml:Placemark", ns):
-        desc = placemark.find("kml:description", ns)
-        if desc is not None and desc.text.strip() == target_station_name:
-            target_placemark = placemark
-            break
 
-    if target_placemark is None:
-        raise ValueError(f"Station '{target_station_name}' nicht gefunden.")
+def parse_kml(kml_stream, station=None):
+    # station: Stationsname (description) oder Stations-ID (name)
+    if station is None:
+        station = target_station_name
 
-    name = target_placemark.find("kml:name", ns).text.strip()
-    description = target_placemark.find("kml:description", ns).text.strip()
+    # Nur der Placemark der gesuchten Station wird ausgewertet (bei den übrigen werden
+    # nur Name und Beschreibung gelesen); danach wird abgebrochen, der Rest der
+    # Datei wird weder dekomprimiert noch geparst.
+    def wanted(station_id, description):
+        return station in (station_id, description)
 
+    for header, placemark in mosmix_kml.iter_placemarks(kml_stream, wanted=wanted):
+        return header["time_steps"], placemark["forecasts"], placemark["station_id"], placemark["description"]
 
-    forecasts = {}
-    for fc in xml_root.findall(f".//{DWDNS}Forecast"):
-        elName = fc.attrib.get(f"{DWDNS}elementName") or fc.attrib.get("elementName")
-        raw_values = [v.text for v in fc.findall(f"{DWDNS}value")]
-        values = raw_values[0].split() if len(raw_values) == 1 else raw_values
-        forecasts[elName] = values
+    raise ValueError(f"Station '{station}' nicht gefunden.")
 
-    return timeSteps, forecasts, name, description
 
-
-def build_summary(timeSteps, forecasts, name, description):
-
-    entries = []
-    for i, ts in enumerate(timeSteps):
-        dateObj = datetime.fromisoformat(ts)
-        # In Berliner Zeit konvertieren
-        dateObj = dateObj.astimezone(ZoneInfo("Europe/Berlin"))
-
-        code_raw = forecasts.get("ww", [None] * len(timeSteps))[i]
-        try:
-            code = int(float(code_raw)) if code_raw and code_raw != "-" else None
-        except ValueError:
-            code = None
-        entries.append({"timestamp": dateObj, "hour": dateObj.hour, "code": code, "index": i})
-
-    daysMap = {}
-    for entry in entries:
-
-        period = None
-        for p in PERIODS:
+def _period_tables():
+    # Stunde (0-23) → Index in PERIODS, einmalig aus der Konfiguration abgeleitet
+    period_of_hour = np.full(24, -1, dtype=np.int64)
+    for hour in range(24):
+        for p_idx, p in enumerate(PERIODS):
             if p["startHour"] < p["endHour"]:
-                if p["startHour"] <= entry["hour"] < p["endHour"]:
-                    period = p
+                if p["startHour"] <= hour < p["endHour"]:
+                    period_of_hour[hour] = p_idx
                     break
             else:
-                if entry["hour"] >= p["startHour"] or entry["hour"] < p["endHour"]:
-                    period = p
+                if hour >= p["startHour"] or hour < p["endHour"]:
+                    period_of_hour[hour] = p_idx
                     break
-        if not period:
-            continue
-
-        groupDate = entry["timestamp"]
-        if period["startHour"] > period["endHour"] and entry["hour"] < period["endHour"]:
-            groupDate -= timedelta(days=1)
-
-        dayIso = groupDate.strftime("%Y-%m-%d")
-        today = datetime.now().date()
-        diffDays = (groupDate.date() - today).days
+    # Perioden über Mitternacht: Stunden nach 0 Uhr zählen zum Vortag
+    previous_day = np.array([
+        PERIODS[p_idx]["startHour"] > PERIODS[p_idx]["endHour"] and hour < PERIODS[p_idx]["endHour"]
+        if p_idx >= 0 else False
+        for hour, p_idx in enumerate(period_of_hour)
+    ])
+    return period_of_hour, previous_day
+
+
+PERIOD_OF_HOUR, PERIOD_PREVIOUS_DAY = _period_tables()
+PERIOD_NAMES = [p["name"] for p in PERIODS]
+NIGHT_PERIODS = ["Abend", "Spät Abends", "Nacht"]
+BERLIN = ZoneInfo("Europe/Berlin")
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 86400
+
+
+def _utc_offset(seconds):
+    return int(datetime.fromtimestamp(int(seconds), BERLIN).utcoffset().total_seconds())
+
+
+def _berlin_offsets(utc_seconds):
+    # UTC-Offset für jeden Zeitschritt. Statt jeden Zeitpunkt einzeln
+    # umzurechnen, wird nur an Intervallgrenzen nachgeschlagen und bis zum
+    # Sommer-/Winterzeitwechsel halbiert (O(log n) Zeitzonen-Abfragen).
+    offsets = np.empty(len(utc_seconds), dtype=np.int64)
+    if len(utc_seconds) == 0:
+        return offsets
+
+    def fill(lo, hi, off_lo, off_hi):
+        # Zwischen zwei Wechseln liegen Monate, gleiche Offsets an den Enden eines
+        # kürzeren Abschnitts bedeuten also einen einheitlichen Offset
+        if off_lo == off_hi and utc_seconds[hi] - utc_seconds[lo] < 60 * SECONDS_PER_DAY:
+            offsets[lo:hi + 1] = off_lo
+        elif hi - lo <= 1:
+            offsets[lo], offsets[hi] = off_lo, off_hi
+        else:
+            mid = (lo + hi) // 2
+            off_mid = _utc_offset(utc_seconds[mid])
+            fill(lo, mid, off_lo, off_mid)
+            fill(mid, hi, off_mid, off_hi)
+
+    last = len(utc_seconds) - 1
+    fill(0, last, _utc_offset(utc_seconds[0]), _utc_offset(utc_seconds[last]))
+    return offsets
+
+
+def _offset_suffix(offset):
+    sign = "+" if offset >= 0 else "-"
+    hours, minutes = divmod(abs(int(offset)) // 60, 60)
+    return f"{sign}{hours:02d}:{minutes:02d}"
+
+
+@lru_cache(maxsize=8)
+def _time_bins(timeSteps, today):
+    # Zeitschritte einmal in Perioden-/Tages-Bins einteilen. Hängt nur von den
+    # Zeitschritten des Laufs ab und wird für alle Stationen wiederverwendet.
+    if all(ts.endswith("Z") for ts in timeSteps):
+        utc = np.array([ts[:-1] for ts in timeSteps], dtype="datetime64[s]")
+        utc_seconds = utc.astype(np.int64)
+        utc_iso = [s + "+00:00" for s in np.datetime_as_string(utc, unit="s")]
+    else:
+        parsed = [datetime.fromisoformat(ts) for ts in timeSteps]
+        utc_seconds = np.array([int(d.timestamp()) for d in parsed], dtype=np.int64)
+        utc_iso = [d.isoformat() for d in parsed]
+
+    offsets = _berlin_offsets(utc_seconds)
+    local_seconds = utc_seconds + offsets
+    local_day = local_seconds // SECONDS_PER_DAY
+    hour = (local_seconds % SECONDS_PER_DAY) // 3600
+
+    period = PERIOD_OF_HOUR[hour]
+    group_day = local_day - PERIOD_PREVIOUS_DAY[hour]
+
+    local_iso = np.datetime_as_string(local_seconds.astype("datetime64[s]"), unit="s")
+    suffixes = {o: _offset_suffix(o) for o in np.unique(offsets).tolist()}
+    local_iso = [ts + suffixes[o] for ts, o in zip(local_iso.tolist(), offsets.tolist())]
+
+    # Tage in der Reihenfolge ihres ersten Auftretens
+    valid = period >= 0
+    days, first_index, inverse = np.unique(group_day[valid], return_index=True, return_inverse=True)
+    rank_of_day = np.argsort(np.argsort(first_index))
+    days = days[np.argsort(first_index)]
+    day_rank = np.full(len(timeSteps), -1, dtype=np.int64)
+    day_rank[valid] = rank_of_day[inverse.ravel()]
+
+    today_day = today.toordinal() - EPOCH_ORDINAL
+    day_labels = []
+    for day in days.tolist():
+        diffDays = day - today_day
+        groupDate = date.fromordinal(EPOCH_ORDINAL + day)
         displayDate = "Heute" if diffDays == 0 else "Morgen" if diffDays == 1 else "Übermorgen" if diffDays == 2 else groupDate.strftime("%a, %d.%m.")
-
-        if dayIso not in daysMap:
-            daysMap[dayIso] = {"displayDate": displayDate, "groups": {}}
-        if period["name"] not in daysMap[dayIso]["groups"]:
-            daysMap[dayIso]["groups"][period["name"]] = []
-        daysMap[dayIso]["groups"][period["name"]].append(entry)
-
-    result = {
-        "name": name,
-        "description": description,
-        "days": {}
+        day_labels.append(displayDate)
+
+    # Gruppenschlüssel Tag × Periode, stabil sortiert (innerhalb einer Gruppe zeitlich)
+    key = np.where(valid, day_rank * len(PERIODS) + period, -1)
+    order = np.argsort(key, kind="stable")
+    order = order[key[order] >= 0]
+
+    return {
+        "day_labels": day_labels,
+        "key": key,
+        "order": order,
+        "local_iso": local_iso,
+        "utc_iso": utc_iso,
     }
 
-    for dayIso, dayData in daysMap.items():
-        result["days"][dayData["displayDate"]] = []
-        for periodName in PERIOD_ORDER:
-            entries = dayData["groups"].get(periodName, [])
-            if not entries:
-                continue
 
-            ww_values_in_period = [e["code"] for e in entries if e["code"] is not None]
-            if not ww_values_in_period:
-                continue
+def _to_float(values, n):
+    # Strings → float64, '-'/leer/unlesbar → NaN
+    if values is None:
+        return np.full(n, np.nan)
+    cleaned = ["nan" if not v or v == "-" else v for v in values]
+    try:
+        return np.array(cleaned, dtype=np.float64)
+    except ValueError:
+        out = np.full(n, np.nan)
+        for i, v in enumerate(cleaned):
+            try:
+                out[i] = float(v)
+            except ValueError:
+                pass
+        return out
+
+
+def _grouped(values, order, starts, ends):
+    # Summe und Anzahl gültiger Werte je Gruppe (Werte in zeitlicher Reihenfolge).
+    # Die Summe selbst läuft über sum(), damit sie bitgleich zur bisherigen
+    # Rundung bleibt (kompensierte Summation ab Python 3.12).
+    sorted_values = values[order]
+    valid = ~np.isnan(sorted_values)
+    counts = np.add.reduceat(valid.astype(np.int64), starts).tolist()
+    kept = sorted_values.tolist()
+    sums = [sum(v for v in kept[start:end] if v == v) for start, end in zip(starts.tolist(), ends)]
+    return sums, counts
 
-            dominantCode = max(ww_values_in_period)
-
-            # Speziallogik für Bewölkung (Codes 0–3)
-            if dominantCode in [0, 1, 2, 3]:
-                # Berechne durchschnittliche Bewölkung (Neff)
-                cloud_vals = []
-                for e in entries:
-                    idx = e["index"]
-                    neff = forecasts.get("Neff", [None])[idx]
-                    try:
-                        if neff and neff != "-":
-                            cloud_vals.append(float(neff))
-                    except ValueError:
-                        continue
-
-                if cloud_vals:
-                    avg_cloud = sum(cloud_vals) / len(cloud_vals)
-                    # Mapping wie im JS
-                    if avg_cloud <= 20:
-                        dominantCode = 0
-                    elif avg_cloud <= 50:
-                        dominantCode = 1
-                    elif avg_cloud <= 80:
-                        dominantCode = 2
-                    else:
-                        dominantCode = 3
-            
-            # GEÄNDERT: Wähle das Icon-Set basierend auf der Tageszeit
-            is_night_period = periodName in ["Abend", "Spät Abends", "Nacht"]
-            if is_night_period and dominantCode in [0, 1, 2]:
-                # Wenn es eine Nachtperiode ist und der Code 0-2 ist, nutze das Nacht-Icon-Set
-                info = WW_ICON_MAP_NIGHT.get(dominantCode, {"icon": "URL/unknown.png", "label": "unbekannt"})
-            else:
-                # Ansonsten nutze das Standard-Icon-Set
-                info = WW_ICON_MAP.get(dominantCode, {"icon": "URL/unknown.png", "label": "unbekannt"})
-
-
-            timestep_entries = []
-            ww_vals, ttt_vals, rr1_vals, neff_vals = [], [], [], []
-
-            for e in entries:
-                idx = e["index"]
-                ww = forecasts.get("ww", [None])[idx]
-                ttt = forecasts.get("TTT", [None])[idx]
-                rr1 = forecasts.get("RR1c", [None])[idx]
-                neff = forecasts.get("Neff", [None])[idx]
-
-                try:
-                    if ww and ww != "-": ww_vals.append(float(ww))
-                    if ttt and ttt != "-": ttt_vals.append(float(ttt))
-                    if rr1 and rr1 != "-": rr1_vals.append(float(rr1))
-                    if neff and neff != "-": neff_vals.append(float(neff))
-                except ValueError:
-                    pass
-                
-                try:
-                    ttt_c = round(float(ttt) - 273.15, 1) if ttt and ttt != "-" else None
-                except ValueError:
-                    ttt_c = None
-
-
-                timestep_entries.append({
-                    "timestamp": e["timestamp"].isoformat(),
-                    "WW": ww,
-                    "TTT": ttt_c,
-                    "RR1c": rr1,
-                    "Neff": neff
-                })
 
-            def avg(lst):
-                return round(sum(lst) / len(lst), 1) if lst else None
+def build_summary(timeSteps, forecasts, name, description):
+    n = len(timeSteps)
+    bins = _time_bins(tuple(timeSteps), datetime.now().date())
 
-            avg_data = {
-                "WW": avg(ww_vals),
-                "TTT": round(avg(ttt_vals) - 273.15, 1) if ttt_vals else None,
-                "RR1c": round(sum(rr1_vals), 1) if rr1_vals else None,  # kumulierte Niederschlagsmenge
-                "Neff": avg(neff_vals)
-            }
+    ww_raw = forecasts.get("ww")
+    ttt_raw = forecasts.get("TTT")
+    rr1_raw = forecasts.get("RR1c")
+    neff_raw = forecasts.get("Neff")
 
+    # Elemente einmal in float-Arrays umwandeln
+    ww = _to_float(ww_raw, n)
+    ttt = _to_float(ttt_raw, n)
+    rr1 = _to_float(rr1_raw, n)
+    neff = _to_float(neff_raw, n)
+    code = np.trunc(ww)
 
+    result = {
+        "name": name,
+        "description": description,
+        "days": {label: [] for label in bins["day_labels"]}
+    }
 
-            result["days"][dayData["displayDate"]].append({
-                "period": periodName,
-                "icon": info["icon"],
-                "label": info["label"],
-                "avg": avg_data,
-                "details": timestep_entries
-            })
+    order = bins["order"]
+    if len(order):
+        sorted_key = bins["key"][order]
+        starts = np.flatnonzero(np.r_[True, sorted_key[1:] != sorted_key[:-1]])
+        group_keys = sorted_key[starts].tolist()
+        ends = np.r_[starts[1:], len(order)].tolist()
+
+        # Gruppierte Reduktionen: dominanter Code (Max), Mittel- und Summenwerte
+        sorted_code = code[order]
+        has_code = np.add.reduceat((~np.isnan(sorted_code)).astype(np.int64), starts)
+        dominant = np.maximum.reduceat(np.where(np.isnan(sorted_code), -np.inf, sorted_code), starts)
+        ww_sum, ww_cnt = _grouped(ww, order, starts, ends)
+        ttt_sum, ttt_cnt = _grouped(ttt, order, starts, ends)
+        rr1_sum, rr1_cnt = _grouped(rr1, order, starts, ends)
+        neff_sum, neff_cnt = _grouped(neff, order, starts, ends)
+
+        # Bewölkungsklasse aus mittlerem Neff (Mapping wie im JS)
+        neff_mean = np.array(neff_sum) / np.maximum(neff_cnt, 1)
+        cloud_class = np.digitize(neff_mean, [20, 50, 80], right=True)
+
+        ttt_c = [round(v - 273.15, 1) if v == v else None for v in ttt.tolist()]
+        missing = [None] * n
+        ww_list = ww_raw if ww_raw is not None else missing
+        rr1_list = rr1_raw if rr1_raw is not None else missing
+        neff_list = neff_raw if neff_raw is not None else missing
+        order_list = order.tolist()
+
+        # Ergebnis nach Tagen und in PERIOD_ORDER aufbauen
+        groups = {}
+        for g, group_key in enumerate(group_keys):
+            groups[group_key] = g
+
+        for day_rank, displayDate in enumerate(bins["day_labels"]):
+            for periodName in PERIOD_ORDER:
+                g = groups.get(day_rank * len(PERIODS) + PERIOD_NAMES.index(periodName))
+                if g is None or not has_code[g]:
+                    continue
+
+                dominantCode = int(dominant[g])
+
+                # Speziallogik für Bewölkung (Codes 0–3)
+                if dominantCode in [0, 1, 2, 3] and neff_cnt[g]:
+                    dominantCode = int(cloud_class[g])
+
+                is_night_period = periodName in NIGHT_PERIODS
+                if is_night_period and dominantCode in [0, 1, 2]:
+                    info = WW_ICON_MAP_NIGHT.get(dominantCode, {"icon": "URL/unknown.png", "label": "unbekannt"})
+                else:
+                    info = WW_ICON_MAP.get(dominantCode, {"icon": "URL/unknown.png", "label": "unbekannt"})
+
+                timestep_entries = [
+                    {
+                        "timestamp": bins["local_iso"][idx],
+                        "WW": ww_list[idx],
+                        "TTT": ttt_c[idx],
+                        "RR1c": rr1_list[idx],
+                        "Neff": neff_list[idx]
+                    }
+                    for idx in order_list[starts[g]:ends[g]]
+                ]
+
+                def avg(total, count):
+                    return round(total / count, 1) if count else None
+
+                avg_data = {
+                    "WW": avg(ww_sum[g], ww_cnt[g]),
+                    "TTT": round(avg(ttt_sum[g], ttt_cnt[g]) - 273.15, 1) if ttt_cnt[g] else None,
+                    "RR1c": round(rr1_sum[g], 1) if rr1_cnt[g] else None,  # kumulierte Niederschlagsmenge
+                    "Neff": avg(neff_sum[g], neff_cnt[g])
+                }
+
+                result["days"][displayDate].append({
+                    "period": periodName,
+                    "icon": info["icon"],
+                    "label": info["label"],
+                    "avg": avg_data,
+                    "details": timestep_entries
+                })
 
     # Zusätzliche Daten im Ergebnis ergänzen
-    result["timeSteps"] = [datetime.fromisoformat(ts).isoformat() for ts in timeSteps]
+    result["timeSteps"] = list(bins["utc_iso"])
     result["parameters"] = {
         "WW": forecasts.get("ww", []),
         "TTT": forecasts.get("TTT", []),
@@ -281,15 +409,202 @@ def build_summary(timeSteps, forecasts, name, description):
 
     return result
 
+
+def summary_is_for(path, station, issue_time):
+    # Vorhandene Zusammenfassung gehört zur angefragten Station und zum Lauf issue_time?
+    if issue_time is None:
+        return False
+    try:
+        with open(path, encoding="utf-8") as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return station in (summary.get("name"), summary.get("description")) and summary.get("issueTime") == issue_time
+
+
+def nearest_station(kmz, lat, lon):
+    # Index wiederverwenden; fehlt er, einmal aus derselben KML aufbauen
+    index = station_index.load_index()
+    if index is None:
+        log("Kein Stationsindex vorhanden, baue ihn aus der KML auf")
+        with open_kml(kmz) as kml_stream:
+            index = station_index.build_from_kml(kml_stream)
+    station = index.nearest(lat, lon)[0]
+    log(f"Nächste Station zu {lat}, {lon}: {station['description']} ({station['station_id']}), {station['distance_m'] / 1000:.1f} km")
+    return station["station_id"]
+
+
+def shard_name(station_id):
+    # Stations-IDs sind Dateinamen; alles außer Buchstaben/Ziffern ersetzen
+    return re.sub(r"[^A-Za-z0-9_-]", "_", station_id) + ".json"
+
+
+def shard_elements(forecasts):
+    # Alle Elemente, die die Landing Page zeigt oder für die Zusammenfassung braucht
+    return {k: v for k, v in forecasts.items() if k not in PAGE_EXCLUDED_ELEMENTS or k in SUMMARY_ELEMENTS}
+
+
+def _write_shards(timeSteps, issue_time, batch, shard_dir):
+    # Läuft im Worker-Prozess: Zusammenfassungen bauen und direkt schreiben,
+    # zurück an den Hauptprozess gehen nur die Dateinamen. Neben der Zusammenfassung
+    # enthält jeder Shard alle Reihen für die Diagramme der Seite ("forecasts",
+    # Werte wie in der KML); "parameters" steckt darin schon und entfällt
+    written = []
+    for station_id, description, height, forecasts in batch:
+        summary = build_summary(timeSteps, forecasts, station_id, description)
+        del summary["parameters"]
+        summary.update({"height": height, "issueTime": issue_time, "forecasts": forecasts})
+        name = shard_name(station_id)
+        tmp_path = os.path.join(shard_dir, f".{name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, os.path.join(shard_dir, name))
+        written.append((station_id, description, name))
+    return written
+
+
+def manifest_issue_time(shard_dir):
+    try:
+        with open(os.path.join(shard_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f).get("issueTime")
+    except (OSError, ValueError):
+        return None
+
+
+def kml_issue_time(kmz):
+    # IssueTime des Laufs in der zwischengespeicherten KMZ. Sie steht vor dem ersten
+    # Placemark, entpackt und geparst wird nur bis dorthin. None ohne Cache (kmz None)
+    if kmz is None:
+        return None
+    with open_kml(kmz) as kml_stream:
+        for header, _ in mosmix_kml.iter_placemarks(kml_stream, forecasts=False):
+            return header["issue_time"]
+    return None
+
+
+def build_all_summaries(kml_stream, shard_dir=SHARD_DIR, max_workers=None, batch_size=SHARD_BATCH_SIZE):
+    # Ein Durchlauf durch die KML, die Stationen werden in Päckchen auf einen
+    # Prozess-Pool verteilt. Es sind nur wenige Päckchen gleichzeitig unterwegs,
+    # damit nicht die ganze Datei im Speicher landet, während die Worker rechnen.
+    os.makedirs(shard_dir, exist_ok=True)
+    max_workers = max_workers or os.cpu_count() or 1
+    stations = {}
+    header = None
+    pending = set()
+
+    def collect(done):
+        for future in done:
+            for station_id, description, name in future.result():
+                stations[station_id] = {"description": description, "file": name}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        batch = []
+        for header, placemark in mosmix_kml.iter_placemarks(kml_stream):
+            batch.append((placemark["station_id"], placemark["description"], placemark["height"],
+                          shard_elements(placemark["forecasts"])))
+            if len(batch) < batch_size:
+                continue
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(_write_shards, header["time_steps"], header["issue_time"], batch, shard_dir))
+            batch = []
+        if batch:
+            pending.add(executor.submit(_write_shards, header["time_steps"], header["issue_time"], batch, shard_dir))
+        collect(wait(pending)[0])
+
+    if header is None:
+        raise ValueError("Keine Stationen in der KML gefunden.")
+
+    # Manifest zuletzt: die Landing Page sieht nur vollständige Läufe
+    manifest = {
+        "issueTime": header["issue_time"],
+        "generated": datetime.now().astimezone().isoformat(timespec="seconds"),
+        "stations": stations,
+    }
+    tmp_path = os.path.join(shard_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, os.path.join(shard_dir, MANIFEST_FILE))
+
+    # Zusammenfassungen von Stationen, die nicht mehr im Lauf sind, entfernen
+    current = {entry["file"] for entry in stations.values()} | {MANIFEST_FILE}
+    for name in os.listdir(shard_dir):
+        if name.endswith(".json") and name not in current:
+            os.remove(os.path.join(shard_dir, name))
+    return manifest
+
+
 def main():
-    log("Start: KMZ herunterladen")
-    kml_text = load_kmz(BASE_URL)
-    log("KMZ geladen, beginne Parsing")
-    timeSteps, forecasts, name, description = parse_kml(kml_text)
+    parser = argparse.ArgumentParser(description="Erzeugt docs/data/weather-summary.json für eine MOSMIX-Station oder Zusammenfassungen für alle Stationen")
+    parser.add_argument("--station", default=target_station_name, help="Stationsname oder Stations-ID")
+    parser.add_argument("--near", nargs=2, type=float, metavar=("LAT", "LON"), help="nächstgelegene Station zu diesen Koordinaten verwenden")
+    parser.add_argument("--no-cache", action="store_true", help="KMZ ohne Download-Cache direkt aus der HTTP-Antwort streamen")
+    parser.add_argument("--all-stations", action="store_true", help=f"Zusammenfassungen für alle Stationen nach {SHARD_DIR} schreiben")
+    parser.add_argument("--workers", type=int, help="Anzahl Worker-Prozesse im Batch-Modus (Standard: CPU-Kerne)")
+    parser.add_argument("--no-metrics", dest="metrics", action="store_false", help="keine Messwerte je Stufe schreiben")
+    parser.add_argument("--trace-memory", action="store_true", help="Speicherspitze je Stufe mit tracemalloc messen (langsamer)")
+    args = parser.parse_args()
+
+    if args.metrics:
+        instrumentation.start_run("create_widget_info", trace_memory=args.trace_memory)
+    try:
+        run(args)
+    finally:
+        if args.metrics:
+            log(instrumentation.format_summary(instrumentation.finish_run()))
+
+
+def run(args):
+    url = BATCH_URL if args.all_stations else BASE_URL
+    if args.no_cache:
+        log("Start: KMZ wird direkt aus der Antwort gestreamt")
+        kmz = None
+    else:
+        log("Start: KMZ herunterladen")
+        download = load_kmz(url)
+        kmz = download.path
+        log("KMZ geladen" if download.changed else "KMZ unverändert seit dem letzten Lauf")
+
+    if args.all_stations:
+        # Nicht am Flag changed des Downloads festmachen: ein vorheriger Aufruf ohne
+        # --all-stations kann die KMZ schon aktualisiert haben, ohne die Zusammenfassungen neu zu bauen
+        issue_time = kml_issue_time(kmz)
+        if issue_time is not None and manifest_issue_time(SHARD_DIR) == issue_time:
+            log(f"Zusammenfassungen sind aktuell (Lauf {issue_time}), nichts zu tun")
+            return
+        with instrumentation.stage("all_summaries"), open_kml(kmz, url) as kml_stream:
+            manifest = build_all_summaries(kml_stream, shard_dir=SHARD_DIR, max_workers=args.workers)
+        log(f"{len(manifest['stations'])} Zusammenfassungen nach {SHARD_DIR} geschrieben, fertig")
+        return
+
+    station = nearest_station(kmz, *args.near) if args.near else args.station
+
+    # Wie bei den Zusammenfassungen aller Stationen über den gespeicherten Lauf
+    # entscheiden, nicht über changed des Downloads: bricht ein Lauf nach dem Download ab, ist
+    # die KMZ beim nächsten Mal unverändert, die Zusammenfassung aber noch alt
+    issue_time = kml_issue_time(kmz)
+    if summary_is_for(SUMMARY_FILE, station, issue_time):
+        log("Zusammenfassung ist aktuell, nichts zu tun")
+        return
+
+    try:
+        with instrumentation.stage("parse", station=station), open_kml(kmz) as kml_stream:
+            timeSteps, forecasts, name, description = parse_kml(kml_stream, station)
+    except ValueError:
+        if not args.near:
+            raise
+        # Stationsliste hat sich geändert: Index neu aufbauen und erneut suchen
+        station_index.INDEX_FILE.unlink(missing_ok=True)
+        station = nearest_station(kmz, *args.near)
+        with instrumentation.stage("parse", station=station), open_kml(kmz) as kml_stream:
+            timeSteps, forecasts, name, description = parse_kml(kml_stream, station)
     log(f"Parsing fertig, {len(timeSteps)} Timesteps gefunden, baue Zusammenfassung")
-    summary = build_summary(timeSteps, forecasts, name, description)
+    with instrumentation.stage("build_summary", station=name):
+        summary = build_summary(timeSteps, forecasts, name, description)
+    summary["issueTime"] = issue_time
     log("Zusammenfassung erstellt, schreibe JSON-Datei")
-    with open("docs/data/weather-summary.json", "w", encoding="utf-8") as f:
+    with instrumentation.stage("write", station=name), open(SUMMARY_FILE, "w", encoding="utf-8") as f:
         json.dump(summary, f, ensure_ascii=False, indent=2)
     log("Datei gespeichert, fertig")
 
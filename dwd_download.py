@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import instrumentation
+
+# Lokaler HTTP-Cache für die DWD-Dateien: pro URL eine Datei <key>.body und
+# die Validatoren (ETag/Last-Modified) in <key>.json
+CACHE_DIR = Path(__file__).parent / "data" / "http_cache"
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+MAX_CACHE_AGE = 3 * 24 * 3600  # Sekunden
+
+CHUNK_SIZE = 1024 * 1024
+
+# Parallele Downloads (z.B. MOSMIX_L pro Station)
+MAX_WORKERS = 8
+RETRIES = 3
+
+# changed=False: Server hat 304 geliefert oder der Inhalt ist identisch mit dem Cache
+FetchResult = namedtuple("FetchResult", ["url", "path", "changed", "status"])
+
+
+def _cache_key(url):
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def _load_meta(meta_path):
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta_path, meta):
+    tmp_path = meta_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def fetch(url, cache_dir=CACHE_DIR, session=None, timeout=30,
+          max_bytes=MAX_CACHE_BYTES, max_age=MAX_CACHE_AGE, evict=True):
+    # Lädt url mit If-None-Match/If-Modified-Since. Bei 304 wird die Datei aus
+    # dem Cache verwendet. Fehler (HTTP oder Netzwerk) werden als
+    # requests.RequestException weitergereicht.
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = _cache_key(url)
+    body_path = cache_dir / f"{key}.body"
+    meta_path = cache_dir / f"{key}.json"
+
+    meta = _load_meta(meta_path) if body_path.exists() else None
+    headers = {}
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    http = session if session is not None else requests
+    with http.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304 and meta is not None:
+            # Unverändert: Eintrag als zuletzt benutzt markieren
+            os.utime(body_path)
+            meta["checked"] = time.time()
+            _write_meta(meta_path, meta)
+            result = FetchResult(url, body_path, False, 304)
+        else:
+            response.raise_for_status()  # Fehler werfen bei HTTP-Code != 200
+            digest = hashlib.sha256()
+            size = 0
+            tmp_path = cache_dir / f"{key}.body.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                os.replace(tmp_path, body_path)
+                instrumentation.add_bytes(size)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+
+            sha256 = digest.hexdigest()
+            # Server ohne Validatoren: gleicher Inhalt gilt ebenfalls als unverändert
+            changed = meta is None or meta.get("sha256") != sha256
+            _write_meta(meta_path, {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha256": sha256,
+                "size": size,
+                "fetched": time.time(),
+                "checked": time.time(),
+            })
+            result = FetchResult(url, body_path, changed, response.status_code)
+
+    if evict:
+        evict_cache(cache_dir, max_bytes=max_bytes, max_age=max_age, keep={key})
+    return result
+
+
+@contextmanager
+def open_stream(url, session=None, timeout=30):
+    # Ungecachter Download als Datenstrom: der Aufrufer liest direkt aus der
+    # Antwort, ohne dass die Datei auf der Platte oder im Speicher landet
+    http = session if session is not None else requests
+    with http.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        yield response.raw
+
+
+def evict_cache(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, max_age=MAX_CACHE_AGE, keep=()):
+    # Zuerst alles älter als max_age entfernen, dann die am längsten nicht
+    # benutzten Einträge, bis die Gesamtgröße unter max_bytes liegt.
+    cache_dir = Path(cache_dir)
+    now = time.time()
+    entries = []
+    for body_path in cache_dir.glob("*.body"):
+        try:
+            stat = body_path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, body_path.stem))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, key in entries:
+        if key in keep:
+            continue
+        if now - mtime <= max_age and total <= max_bytes:
+            continue
+        # Auch Nebendateien (z.B. Indexdateien von cfgrib) des Eintrags entfernen
+        for path in cache_dir.glob(f"{key}.*"):
+            path.unlink(missing_ok=True)
+        total -= size
+
+
+def make_session(pool_size=MAX_WORKERS, retries=RETRIES, backoff_factor=0.5):
+    # Eine Session mit Connection-Pool für alle Worker; Wiederholungen bei
+    # Verbindungsfehlern und 429/5xx mit exponentiellem Backoff
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _fetch_stage(key, url, **kwargs):
+    # Ein Download aus fetch_many als eigene Stufe (Schlüssel als Station)
+    with instrumentation.stage("download", station=key, url=url):
+        return fetch(url, **kwargs)
+
+
+def fetch_many(urls, max_workers=MAX_WORKERS, timeout=30, retries=RETRIES, cache_dir=CACHE_DIR,
+               max_bytes=MAX_CACHE_BYTES, max_age=MAX_CACHE_AGE):
+    # urls: dict Schlüssel → URL. Liefert (Schlüssel, FetchResult, Fehler) in der
+    # Reihenfolge, in der die Downloads fertig werden, damit der Aufrufer schon
+    # weiterarbeiten kann, während die restlichen Dateien noch laden.
+    # Bei einem Fehler ist FetchResult None und Fehler die Exception.
+    with make_session(pool_size=max_workers, retries=retries) as session, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_fetch_stage, key, url, cache_dir=cache_dir, session=session, timeout=timeout, evict=False): key
+            for key, url in urls.items()
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                yield key, future.result(), None
+            except requests.RequestException as e:
+                yield key, None, e
+
+    # Aufräumen erst am Ende, damit sich die Worker nicht gegenseitig Dateien löschen
+    evict_cache(cache_dir, max_bytes=max_bytes, max_age=max_age,
+                keep={_cache_key(url) for url in urls.values()})
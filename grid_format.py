@@ -0,0 +1,140 @@
+import json
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+# Selbstbeschreibendes Gitterformat für docs/data/*.grid (gelesen von
+# docs/scripts/uv_and_pt_script.js):
+#
+#   4 Bytes   b"GRD1"
+#   4 Bytes   Länge des Kopfes in Bytes (uint32, little endian)
+#   Kopf      JSON (UTF-8), mit Leerzeichen auf ein Vielfaches von 8 Bytes aufgefüllt
+#   Daten     Rohwerte (uint8/uint16, little endian), Reihenfolge Zeitschritt, lat, lon;
+#             bei "compression": "deflate" als ein zlib-Strom
+#
+# Wert = offset + scale * Rohwert; Rohwert == nodata (größter Wert des Typs) heißt
+# fehlend (NaN). Das Gitter ist regelmäßig und wird nur über Ursprung, Schritt und
+# Anzahl beschrieben: lat = lat0 + i * dlat, lon = lon0 + j * dlon.
+MAGIC = b"GRD1"
+_PREFIX = struct.Struct("<4sI")
+ALIGNMENT = 8
+
+# dtype: "uint8" oder "uint16"; Werte außerhalb von offset .. offset + scale * (nodata - 1)
+# werden auf den Rand gesetzt
+Quantization = namedtuple("Quantization", ["dtype", "offset", "scale"])
+
+DTYPES = {"uint8": np.dtype("<u1"), "uint16": np.dtype("<u2")}
+
+WriteResult = namedtuple("WriteResult", ["path", "shape", "raw_bytes", "file_bytes", "clipped"])
+
+
+def regular_axis(values, rtol=1e-4):
+    # (Ursprung, Schritt) einer regelmäßigen Achse; ValueError, wenn die Abstände schwanken
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 2:
+        return float(values[0]), 0.0
+    step = (values[-1] - values[0]) / (len(values) - 1)
+    if not np.allclose(np.diff(values), step, rtol=rtol, atol=abs(step) * rtol):
+        raise ValueError("Achse ist nicht regelmäßig")
+    return float(values[0]), float(step)
+
+
+def quantize(field, quantization):
+    # Liefert (Rohwerte, Anzahl abgeschnittener Werte)
+    dtype = DTYPES[quantization.dtype]
+    nodata = np.iinfo(dtype).max
+    raw = np.rint((np.asarray(field, dtype=np.float64) - quantization.offset) / quantization.scale)
+    missing = ~np.isfinite(raw)
+    clipped = int(np.count_nonzero((raw < 0) | (raw > nodata - 1)))
+    raw = np.clip(raw, 0, nodata - 1)
+    raw[missing] = nodata
+    return raw.astype(dtype), clipped
+
+
+def _header_bytes(header):
+    data = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    padding = -(_PREFIX.size + len(data)) % ALIGNMENT
+    return data + b" " * padding
+
+
+def write(path, variable, fields, latitudes, longitudes, times, quantization, compress=True, attrs=None):
+    # fields: Iterable von 2D-Feldern (lat, lon), eines pro Zeitschritt; wird
+    # gestreamt, im Speicher liegt nur das aktuelle Feld
+    lat0, dlat = regular_axis(latitudes)
+    lon0, dlon = regular_axis(longitudes)
+    dtype = DTYPES[quantization.dtype]
+    header = {
+        "variable": variable,
+        "dtype": quantization.dtype,
+        "scale": quantization.scale,
+        "offset": quantization.offset,
+        "nodata": int(np.iinfo(dtype).max),
+        "grid": {"lat0": lat0, "dlat": dlat, "nlat": len(latitudes),
+                 "lon0": lon0, "dlon": dlon, "nlon": len(longitudes)},
+        "times": list(times),
+        "compression": "deflate" if compress else None,
+    }
+    if attrs:
+        header.update(attrs)
+
+    path = os.fspath(path)
+    tmp_path = f"{path}.tmp"
+    compressor = zlib.compressobj(9) if compress else None
+    steps = 0
+    raw_bytes = 0
+    clipped = 0
+    header_data = _header_bytes(header)
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, len(header_data)))
+        f.write(header_data)
+        for field in fields:
+            raw, field_clipped = quantize(field, quantization)
+            if raw.shape != (len(latitudes), len(longitudes)):
+                raise ValueError(f"Feld {raw.shape} passt nicht zum Gitter ({len(latitudes)}, {len(longitudes)})")
+            data = raw.tobytes()
+            f.write(compressor.compress(data) if compressor else data)
+            steps += 1
+            raw_bytes += len(data)
+            clipped += field_clipped
+        if compressor:
+            f.write(compressor.flush())
+    if steps != len(header["times"]):
+        os.remove(tmp_path)
+        raise ValueError(f"{steps} Felder, aber {len(header['times'])} Zeitpunkte")
+    os.replace(tmp_path, path)
+    return WriteResult(path, (steps, len(latitudes), len(longitudes)), raw_bytes, os.path.getsize(path), clipped)
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        magic, length = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path}: keine Gitterdatei ({magic!r})")
+        return json.loads(f.read(length))
+
+
+def read(path):
+    # Liefert (Kopf, float32-Array Zeitschritt × lat × lon mit NaN für fehlende Werte)
+    with open(path, "rb") as f:
+        magic, length = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path}: keine Gitterdatei ({magic!r})")
+        header = json.loads(f.read(length))
+        data = f.read()
+    if header["compression"] == "deflate":
+        data = zlib.decompress(data)
+    grid = header["grid"]
+    raw = np.frombuffer(data, dtype=DTYPES[header["dtype"]]).reshape(len(header["times"]), grid["nlat"], grid["nlon"])
+    values = (header["offset"] + header["scale"] * raw.astype(np.float64)).astype(np.float32)
+    values[raw == header["nodata"]] = np.nan
+    return header, values
+
+
+def axes(header):
+    # (Breiten, Längen) aus der Gitterbeschreibung
+    grid = header["grid"]
+    return (grid["lat0"] + grid["dlat"] * np.arange(grid["nlat"]),
+            grid["lon0"] + grid["dlon"] * np.arange(grid["nlon"]))
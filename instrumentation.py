@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+
+# Messung der Pipeline-Stufen: Wandzeit, CPU-Zeit des Prozesses, heruntergeladene
+# Bytes und (optional, tracemalloc) Speicherspitze je Stufe und Station.
+#
+#   instrumentation.start_run("main48", trace_memory=True)
+#   with instrumentation.stage("parse", station="10865"):
+#       ...
+#   instrumentation.finish_run()   # → data/metrics/main48-<Zeit>.json
+#
+# Für Funktionen, die als Ganzes eine Stufe sind: @instrumentation.timed("download").
+#
+# Ohne start_run ist stage() ein leerer Kontext. Stufen dürfen geschachtelt
+# und in mehreren Threads offen sein; Bytes (add_bytes) zählen für die
+# innerste offene Stufe des Threads und für den ganzen Lauf. Die CPU-Zeit ist
+# die des ganzen Prozesses, bei parallelen Stufen also nur eine Obergrenze.
+# tracemalloc verlangsamt Python-Allokationen deutlich und ist darum aus, wenn
+# nicht ausdrücklich verlangt.
+METRICS_DIR = Path(__file__).parent / "data" / "metrics"
+KEEP_FILES = 50  # pro Laufname
+
+_lock = threading.Lock()
+_local = threading.local()
+_run = None
+
+
+def _new_run(name, trace_memory):
+    return {
+        "name": name,
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "pid": os.getpid(),
+        "trace_memory": trace_memory,
+        "bytes_downloaded": 0,
+        "stages": [],
+        "_start": time.perf_counter(),
+        "_cpu_start": time.process_time(),
+    }
+
+
+def start_run(name, trace_memory=False):
+    global _run
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _run = _new_run(name, trace_memory)
+
+
+def enabled():
+    return _run is not None
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def stage(name, station=None, **fields):
+    # Eine Stufe messen; liefert den Datensatz, in den der Block weitere Felder schreiben kann
+    run = _run
+    if run is None:
+        yield {}
+        return
+
+    record = {"stage": name}
+    if station is not None:
+        record["station"] = station
+    record.update(fields)
+    record["bytes_downloaded"] = 0
+
+    stack = _stack()
+    if stack:
+        record["parent"] = stack[-1]["stage"]
+    tracing = run["trace_memory"] and tracemalloc.is_tracing()
+    if tracing:
+        # Die Spitze der äußeren Stufe sichern, bevor sie für diese Stufe zurückgesetzt wird
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]["_peak"] = max(stack[-1].get("_peak", 0), peak)
+        tracemalloc.reset_peak()
+        record["_base"] = current
+
+    stack.append(record)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["wall_s"] = time.perf_counter() - wall_start
+        record["cpu_s"] = time.process_time() - cpu_start
+        stack.pop()
+        if tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(record.pop("_peak", 0), peak)
+            # Spitze über dem Stand beim Betreten der Stufe
+            record["peak_bytes"] = peak - record.pop("_base")
+            if stack:
+                stack[-1]["_peak"] = max(stack[-1].get("_peak", 0), peak)
+        with _lock:
+            run["stages"].append(record)
+
+
+def timed(name=None, station=None):
+    # Dekorator: jeder Aufruf ist eine Stufe (Standardname: Funktionsname)
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name or func.__name__, station=station):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_bytes(count):
+    # Heruntergeladene Bytes der innersten offenen Stufe dieses Threads und dem Lauf zuschlagen
+    run = _run
+    if run is None:
+        return
+    stack = _stack()
+    with _lock:
+        run["bytes_downloaded"] += count
+        if stack:
+            stack[-1]["bytes_downloaded"] += count
+
+
+@contextmanager
+def recording(name="worker"):
+    # Eigener Lauf nur für diesen Block, z.B. in einem Worker-Prozess. Liefert die
+    # Liste der Stufen, die der Aufrufer zurückgibt und im Hauptprozess mit extend() übernimmt
+    global _run
+    previous = _run
+    _run = _new_run(name, tracemalloc.is_tracing())
+    try:
+        yield _run["stages"]
+    finally:
+        _run = previous
+
+
+def extend(records):
+    run = _run
+    if run is None or not records:
+        return
+    with _lock:
+        run["stages"].extend(records)
+        run["bytes_downloaded"] += sum(r.get("bytes_downloaded", 0) for r in records)
+
+
+def summarize(records):
+    # dict Stufe → Anzahl, Summen von Wand-/CPU-Zeit und Bytes, größte Speicherspitze
+    summary = {}
+    for record in records:
+        entry = summary.setdefault(record["stage"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "bytes_downloaded": 0})
+        entry["count"] += 1
+        entry["wall_s"] += record["wall_s"]
+        entry["cpu_s"] += record["cpu_s"]
+        entry["bytes_downloaded"] += record.get("bytes_downloaded", 0)
+        if "peak_bytes" in record:
+            entry["peak_bytes"] = max(entry.get("peak_bytes", 0), record["peak_bytes"])
+        if "error" in record:
+            entry["errors"] = entry.get("errors", 0) + 1
+    return summary
+
+
+def finish_run(path=None, metrics_dir=METRICS_DIR, keep=KEEP_FILES):
+    # Messung beenden und als JSON schreiben; liefert den Pfad (None ohne laufende Messung)
+    global _run
+    run, _run = _run, None
+    if run is None:
+        return None
+
+    with _lock:
+        stages = list(run["stages"])
+    report = {k: v for k, v in run.items() if not k.startswith("_") and k != "stages"}
+    report["wall_s"] = time.perf_counter() - run["_start"]
+    report["cpu_s"] = time.process_time() - run["_cpu_start"]
+    if run["trace_memory"] and tracemalloc.is_tracing():
+        report["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    report["summary"] = summarize(stages)
+    report["stages"] = stages
+
+    if path is None:
+        metrics_dir = Path(metrics_dir)
+        path = metrics_dir / f"{run['name']}-{datetime.now().strftime('%Y%m%dT%H%M%S')}-{run['pid']}.json"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+    # Nur die letzten keep Dateien dieses Laufnamens behalten
+    if keep:
+        previous = sorted(path.parent.glob(f"{run['name']}-*.json"))
+        for old in previous[:-keep]:
+            old.unlink(missing_ok=True)
+    return path
+
+
+def format_summary(path):
+    # Kurze Tabelle aus einer Metrikdatei, nach Wandzeit sortiert
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    lines = [f"{report['name']}: {report['wall_s']:.2f} s Wandzeit, {report['cpu_s']:.2f} s CPU, "
+             f"{report['bytes_downloaded'] / 1024:.0f} KB geladen"]
+    for name, entry in sorted(report["summary"].items(), key=lambda item: -item[1]["wall_s"]):
+        peak = f", Spitze {entry['peak_bytes'] / 1024 ** 2:.1f} MB" if "peak_bytes" in entry else ""
+        lines.append(f"  {name:<16} {entry['count']:4d}× {entry['wall_s']:8.3f} s, CPU {entry['cpu_s']:8.3f} s{peak}")
+    return "\n".join(lines)
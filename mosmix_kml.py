@@ -0,0 +1,222 @@
+import io
+import os
+import struct
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+
+# Namespaces der DWD-KML-Dateien
+KML_NS = "http://www.opengis.net/kml/2.2"
+DWD_NS = "https://opendata.dwd.de/weather/lib/pointforecast_dwd_extension_V1_0.xsd"
+
+_PLACEMARK = f"{{{KML_NS}}}Placemark"
+_NAME = f"{{{KML_NS}}}name"
+_DESCRIPTION = f"{{{KML_NS}}}description"
+_COORDINATES = f"{{{KML_NS}}}coordinates"
+_FORECAST = f"{{{DWD_NS}}}Forecast"
+_VALUE = f"{{{DWD_NS}}}value"
+_ELEMENT_NAME = f"{{{DWD_NS}}}elementName"
+_TIME_STEP = f"{{{DWD_NS}}}TimeStep"
+_ISSUE_TIME = f"{{{DWD_NS}}}IssueTime"
+
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+_FLAG_DATA_DESCRIPTOR = 0x08
+CHUNK_SIZE = 64 * 1024
+
+
+class _PushbackReader:
+    # Ohne Größenangabe liest der Inflater über das Ende eines Eintrags hinaus;
+    # die überzähligen Bytes werden hier für den nächsten Header zurückgelegt.
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._pending = b""
+
+    def unread(self, data):
+        self._pending = data + self._pending
+
+    def read(self, size):
+        if self._pending:
+            data, self._pending = self._pending[:size], self._pending[size:]
+            return data
+        return self._raw.read(size)
+
+
+class _StreamedZipMember(io.RawIOBase):
+    # Liest einen Eintrag direkt aus einem nicht spulbaren Datenstrom (z.B.
+    # HTTP-Antwort) und entpackt ihn häppchenweise, ohne das Archiv vorher
+    # vollständig zu laden.
+
+    def __init__(self, raw, method, compressed_size, crc):
+        self._raw = raw
+        self._remaining = compressed_size
+        self._crc = crc
+        self._running_crc = 0
+        self._inflater = zlib.decompressobj(-zlib.MAX_WBITS) if method == zipfile.ZIP_DEFLATED else None
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def _read_compressed(self, size):
+        if self._inflater is not None and self._inflater.unconsumed_tail:
+            return self._inflater.unconsumed_tail
+        if self._remaining is not None:
+            size = min(size, self._remaining)
+        data = self._raw.read(size)
+        if self._remaining is not None:
+            self._remaining -= len(data)
+        return data
+
+    def readinto(self, buffer):
+        while not self._eof:
+            chunk = self._read_compressed(CHUNK_SIZE if self._inflater is not None else len(buffer))
+            if self._inflater is None:
+                data = chunk
+                self._eof = not chunk or self._remaining == 0
+            else:
+                if not chunk and not self._inflater.unconsumed_tail:
+                    raise EOFError("KMZ-Datenstrom endet mitten im Eintrag.")
+                data = self._inflater.decompress(chunk, len(buffer))
+                self._eof = self._inflater.eof
+                if self._eof and self._inflater.unused_data:
+                    self._raw.unread(self._inflater.unused_data)
+            if self._crc is not None:
+                self._running_crc = zlib.crc32(data, self._running_crc)
+                if self._eof and self._running_crc != self._crc:
+                    raise zipfile.BadZipFile("CRC-Fehler im KMZ-Datenstrom.")
+            if data:
+                buffer[:len(data)] = data
+                return len(data)
+        return 0
+
+
+def _read_exactly(raw, size):
+    data = b""
+    while len(data) < size:
+        chunk = raw.read(size - len(data))
+        if not chunk:
+            raise EOFError("KMZ-Datenstrom endet mitten im Header.")
+        data += chunk
+    return data
+
+
+def _stream_kml_member(raw):
+    # Lokale Header der Reihe nach lesen, bis der .kml-Eintrag kommt
+    raw = _PushbackReader(raw)
+    while True:
+        fields = _LOCAL_HEADER.unpack(_read_exactly(raw, _LOCAL_HEADER.size))
+        signature, _, flags, method, _, _, crc, compressed_size, _, name_length, extra_length = fields
+        if signature != _LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile("Keine KML im KMZ-Datenstrom gefunden.")
+        name = _read_exactly(raw, name_length).decode("cp437")
+        _read_exactly(raw, extra_length)
+
+        sizes_known = not flags & _FLAG_DATA_DESCRIPTOR
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise zipfile.BadZipFile(f"Kompressionsmethode {method} wird nicht unterstützt.")
+        if method == zipfile.ZIP_STORED and not sizes_known:
+            raise zipfile.BadZipFile("Unkomprimierter Eintrag ohne Größenangabe kann nicht gestreamt werden.")
+
+        member = _StreamedZipMember(
+            raw, method,
+            compressed_size if sizes_known else None,
+            crc if sizes_known else None,
+        )
+        if name.endswith(".kml"):
+            return io.BufferedReader(member, buffer_size=CHUNK_SIZE)
+
+        # Anderen Eintrag überspringen (inkl. eventuellem Data Descriptor)
+        while member.read(CHUNK_SIZE):
+            pass
+        if not sizes_known:
+            descriptor = _read_exactly(raw, 12)
+            if descriptor[:4] == b"PK\x07\x08":
+                _read_exactly(raw, 4)
+
+
+@contextmanager
+def open_kml_member(kmz):
+    # KML direkt aus dem Zip-Archiv in den Parser streamen, ohne auf die Platte
+    # zu entpacken und ohne das Archiv oder die KML komplett in den Speicher zu laden.
+    # kmz: Pfad, spulbares Dateiobjekt oder nicht spulbarer Datenstrom (HTTP-Antwort)
+    seekable = isinstance(kmz, (str, os.PathLike)) or (hasattr(kmz, "seekable") and kmz.seekable())
+    if seekable:
+        with zipfile.ZipFile(kmz, "r") as z:
+            kml_name = [f for f in z.namelist() if f.endswith(".kml")][0]
+            with z.open(kml_name) as kml_stream:
+                yield kml_stream
+    else:
+        with _stream_kml_member(kmz) as kml_stream:
+            yield kml_stream
+
+
+def _read_placemark(placemark, station_id, description, read_forecasts=True):
+    coordinates = placemark.findtext(f".//{_COORDINATES}", default="")
+    lon, lat, height = map(float, coordinates.strip().split(","))
+
+    forecasts = {}
+    for forecast_elem in placemark.iter(_FORECAST) if read_forecasts else ():
+        element_name = forecast_elem.get(_ELEMENT_NAME) or forecast_elem.get("elementName")
+        value_text = "".join(v.text or "" for v in forecast_elem.findall(_VALUE))
+        forecasts[element_name] = value_text.split()
+
+    return {
+        "station_id": station_id,
+        "description": description,
+        "lon": lon,
+        "lat": lat,
+        "height": height,
+        "forecasts": forecasts,
+    }
+
+
+def iter_placemarks(kml_stream, wanted=None, forecasts=True):
+    # Streamt die KML einmal durch und liefert pro Station (header, station).
+    # header ist für alle Stationen dasselbe dict mit "issue_time" und "time_steps",
+    # die im Dokument vor den Placemarks stehen.
+    # wanted(station_id, description): nur passende Stationen werden ausgewertet
+    # und geliefert; bei allen anderen werden nur Name und Beschreibung gelesen, die
+    # Wertezeilen nicht. Ohne forecasts bleibt "forecasts" leer (Index, Kopf).
+    # Fertige Placemarks werden aus dem Baum entfernt, damit der Speicher
+    # unabhängig von der Dateigröße begrenzt bleibt.
+    header = {"issue_time": None, "time_steps": []}
+    stack = []
+    for event, elem in ET.iterparse(kml_stream, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        if elem.tag == _TIME_STEP:
+            header["time_steps"].append(elem.text.strip())
+        elif elem.tag == _ISSUE_TIME:
+            header["issue_time"] = elem.text.strip()
+        elif elem.tag == _PLACEMARK:
+            station_id = elem.findtext(_NAME, default="").strip()
+            description = elem.findtext(_DESCRIPTION, default="").strip()
+            station = None
+            if wanted is None or wanted(station_id, description):
+                station = _read_placemark(elem, station_id, description, forecasts)
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+            if station is not None:
+                yield header, station
+
+
+def parse_stations(kml_stream, station_names=None):
+    # Ein Durchlauf für beliebig viele Stationen (Suche über description).
+    # Sobald alle gesuchten Stationen gefunden sind, wird abgebrochen.
+    wanted = set(station_names) if station_names is not None else None
+    stations = {}
+    header = {"issue_time": None, "time_steps": []}
+    match = None if wanted is None else (lambda station_id, description: description in wanted)
+    for header, station in iter_placemarks(kml_stream, wanted=match):
+        stations[station["description"]] = station
+        if wanted is not None and wanted.issubset(stations):
+            break
+    return header, stations
@@ -0,0 +1,192 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+import mosmix_kml
+import station_index
+
+# Ablage der dekodierten Läufe: <STORE_DIR>/<Produkt>/<Lauf>/{values.f32, meta.json}
+STORE_DIR = Path(__file__).parent / "data" / "mosmix_store"
+
+# Abgelegte Läufe je Produkt: der aktuelle und sein Vorgänger (falls ein residenter
+# Prozess den noch offen hat). Ein MOSMIX_S-Lauf sind rund 240 MB float32
+KEEP_RUNS = 2
+
+VALUES_FILE = "values.f32"
+META_FILE = "meta.json"
+
+
+def run_key(issue_time):
+    # "2025-10-18T09:00:00.000Z" -> "20251018T0900Z"
+    issued = datetime.fromisoformat(issue_time.replace("Z", "+00:00"))
+    return issued.strftime("%Y%m%dT%H%MZ")
+
+
+def _decode_values(value_strings, num_steps):
+    # '-' → NaN, sonst float32
+    if len(value_strings) != num_steps:
+        return None
+    return np.array(["nan" if v == "-" else v for v in value_strings], dtype=np.float32)
+
+
+def ingest_kmz(kmz_file, product, store_dir=STORE_DIR, keep_runs=KEEP_RUNS):
+    with mosmix_kml.open_kml_member(kmz_file) as kml_stream:
+        return ingest_kml(kml_stream, product, store_dir=store_dir, keep_runs=keep_runs)
+
+
+def ingest_kml(kml_stream, product, store_dir=STORE_DIR, keep_runs=KEEP_RUNS):
+    # Dekodiert einen MOSMIX-Lauf einmal in einen float32-Würfel
+    # (Station × Element × Zeitschritt). Die Zeilen werden beim Parsen direkt
+    # in die Datei geschrieben, der Speicherbedarf bleibt bei einer Station.
+    # Ist der Lauf schon abgelegt, wird nach dem Kopf der Datei abgebrochen.
+    # Die KML nennt die Elemente nicht vorab: die Elementachse wächst, sobald eine
+    # Station ein neues Element bringt, und frühere Zeilen werden am Ende mit NaN
+    # aufgefüllt (_pad_rows).
+    product_dir = Path(store_dir) / product
+    product_dir.mkdir(parents=True, exist_ok=True)
+
+    run_dir = None
+    tmp_dir = product_dir / f".ingest-{os.getpid()}"
+    values_file = None
+    elements = []
+    element_offsets = {}
+    row_elements = []  # Anzahl Elemente je geschriebener Zeile
+    stations = []
+    header = None
+
+    try:
+        for header, station in mosmix_kml.iter_placemarks(kml_stream):
+            if run_dir is None:
+                run_dir = product_dir / run_key(header["issue_time"])
+                if (run_dir / META_FILE).exists():
+                    return run_dir
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                tmp_dir.mkdir()
+                values_file = open(tmp_dir / VALUES_FILE, "wb")
+
+            for element_name in station["forecasts"]:
+                if element_name not in element_offsets:
+                    element_offsets[element_name] = len(elements)
+                    elements.append(element_name)
+
+            num_steps = len(header["time_steps"])
+            row = np.full((len(elements), num_steps), np.nan, dtype=np.float32)
+            for element_name, value_strings in station["forecasts"].items():
+                values = _decode_values(value_strings, num_steps)
+                if values is None:
+                    print(f"Warnung: {element_name} bei Station {station['station_id']} hat {len(value_strings)} Werte, erwartet: {num_steps}")
+                    continue
+                row[element_offsets[element_name]] = values
+            values_file.write(row.tobytes())
+            row_elements.append(len(elements))
+
+            stations.append({
+                "station_id": station["station_id"],
+                "description": station["description"],
+                "lon": station["lon"],
+                "lat": station["lat"],
+                "height": station["height"],
+            })
+
+        if run_dir is None:
+            raise ValueError("Keine Stationen in der KML gefunden.")
+
+        values_file.close()
+        if row_elements[0] < len(elements):
+            _pad_rows(tmp_dir / VALUES_FILE, row_elements, len(elements), len(header["time_steps"]))
+        meta = {
+            "product": product,
+            "run": run_dir.name,
+            "issue_time": header["issue_time"],
+            "time_steps": header["time_steps"],
+            "elements": elements,
+            "stations": stations,
+            "shape": [len(stations), len(elements), len(header["time_steps"])],
+        }
+        # meta.json zuletzt schreiben: nur vollständige Läufe gelten als vorhanden
+        with open(tmp_dir / META_FILE, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        shutil.rmtree(run_dir, ignore_errors=True)
+        os.replace(tmp_dir, run_dir)
+    finally:
+        if values_file is not None and not values_file.closed:
+            values_file.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    prune_runs(product_dir, keep_runs)
+    return run_dir
+
+
+def _pad_rows(values_path, row_elements, num_elements, num_steps):
+    # Zeilen, die vor dem Auftauchen späterer Elemente geschrieben wurden, auf die
+    # volle Elementachse bringen (fehlende Elemente NaN); Station für Station
+    padded_path = values_path.with_suffix(".padded")
+    with open(values_path, "rb") as src, open(padded_path, "wb") as dst:
+        for count in row_elements:
+            row = np.full((num_elements, num_steps), np.nan, dtype=np.float32)
+            row[:count] = np.frombuffer(src.read(count * num_steps * 4), dtype=np.float32).reshape(count, num_steps)
+            dst.write(row.tobytes())
+    os.replace(padded_path, values_path)
+
+
+def prune_runs(product_dir, keep_runs):
+    runs = sorted(p for p in Path(product_dir).iterdir() if (p / META_FILE).exists())
+    for old_run in runs[:-keep_runs]:
+        shutil.rmtree(old_run, ignore_errors=True)
+
+
+def latest_run(product, store_dir=STORE_DIR):
+    product_dir = Path(store_dir) / product
+    if not product_dir.exists():
+        return None
+    runs = sorted(p for p in product_dir.iterdir() if (p / META_FILE).exists())
+    return runs[-1] if runs else None
+
+
+class MosmixRun:
+    # Lesender Zugriff auf einen abgelegten Lauf. Die Werte werden nur
+    # gemappt, eine Station ist ein Slice des Würfels ohne erneutes Parsen.
+
+    def __init__(self, run_dir):
+        self.run_dir = Path(run_dir)
+        with open(self.run_dir / META_FILE, encoding="utf-8") as f:
+            meta = json.load(f)
+        self.product = meta["product"]
+        self.run = meta["run"]
+        self.issue_time = meta["issue_time"]
+        self.time_steps = meta["time_steps"]
+        self.elements = meta["elements"]
+        self.stations = meta["stations"]
+        self.values = np.memmap(self.run_dir / VALUES_FILE, dtype=np.float32, mode="r", shape=tuple(meta["shape"]))
+
+        self.element_offsets = {name: i for i, name in enumerate(self.elements)}
+        # Zeilen des Würfels liegen in KML-Reihenfolge, Offset im Index = Zeile
+        self.index = station_index.StationIndex(self.stations)
+
+    def station_offset(self, key):
+        # key: Stations-ID oder Stationsname
+        if key not in self.index:
+            raise KeyError(f"Station '{key}' nicht im Lauf {self.product}/{self.run}.")
+        return self.index.offset(key)
+
+    def station(self, key):
+        return self.stations[self.station_offset(key)]
+
+    def station_values(self, key):
+        # dict Element → 1D-View (float32, NaN für '-')
+        block = self.values[self.station_offset(key)]
+        return {name: block[i] for i, name in enumerate(self.elements)}
+
+
+@lru_cache(maxsize=16)
+def _open_run(run_dir):
+    return MosmixRun(run_dir)
+
+
+def open_run(run_dir):
+    return _open_run(str(run_dir))
@@ -1,9 +1,37 @@
-import json
+import argparse
 import os
 from datetime import datetime, timedelta
+import numpy as np
 import requests
 import re
 import xarray as xr
+import dwd_download
+import grid_format
+import instrumentation
+
+DATA_DIR = "docs/data"
+
+# Ausschnitt (lat_min, lat_max, lon_min, lon_max) in Grad, Ränder eingeschlossen.
+# Gefühlte Temperatur: Deutschland und Umgebung, entspricht [200:-232, 450:-677]
+# im 0.0625°-Gitter von ICON-EU. UV-Index: None, ganzes Gebiet
+GFT_BBOX = (42.0, 56.0, 4.625, 20.1875)
+UV_BBOX = None
+
+# Ausgabe im Format von grid_format: (Typ, Variable, Datei)
+GRIDS = [
+    ("gft", "PT1M", f"{DATA_DIR}/gft.grid"),
+    ("uvi", "UVI_MAX_CL", f"{DATA_DIR}/uvi.grid"),
+    ("uvh", "UVI_MAX_H", f"{DATA_DIR}/uvh.grid"),
+]
+OUTPUT_FILES = [path for _, _, path in GRIDS]
+
+# Quantisierung je Variable: gefühlte Temperatur (Kelvin) auf 0.05 K als uint16,
+# UV-Index und Stunde des UV-Maximums auf 0.1 als uint8 (angezeigt wird auf 0.1 gerundet)
+QUANTIZATION = {
+    "PT1M": grid_format.Quantization("uint16", 173.15, 0.05),
+    "UVI_MAX_CL": grid_format.Quantization("uint8", 0.0, 0.1),
+    "UVI_MAX_H": grid_format.Quantization("uint8", 0.0, 0.1),
+}
 
 def download_latest_dwd_file(target_folder, date=None, typ="uvi"):
     if date is None:
@@ -37,15 +65,10 @@ def download_latest_dwd_file(target_folder, date=None, typ="uvi"):
         if matches:
             latest_file = sorted(matches)[-1]
             file_url = base_url + latest_file
-            target_path = os.path.join(target_folder, latest_file)
 
             try:
-                with requests.get(file_url, stream=True) as r:
-                    r.raise_for_status()
-                    with open(target_path, "wb") as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                return target_path
+                # target_folder dient als Download-Cache (ETag/Last-Modified)
+                return dwd_download.fetch(file_url, cache_dir=target_folder)
             except Exception as e:
                 print(f"Error downloading file: {e}")
                 return None
@@ -57,67 +80,122 @@ def download_latest_dwd_file(target_folder, date=None, typ="uvi"):
 def download_all_dwd_types(target_folder, date=None):
     paths = {}
     for typ in ["uvi", "uvh", "gft"]:
-        path = download_latest_dwd_file(target_folder=target_folder, date=date, typ=typ)
+        with instrumentation.stage("download", station=typ):
+            path = download_latest_dwd_file(target_folder=target_folder, date=date, typ=typ)
         paths[typ] = path
     return paths
 
 
 
-def main():
+def _axis_slice(values, low, high):
+    # Zusammenhängender Index-Bereich der Koordinaten in [low, high], Ränder eingeschlossen;
+    # funktioniert für auf- und absteigende Achsen
+    values = np.asarray(values)
+    tolerance = abs(float(values[1] - values[0])) * 1e-3 if len(values) > 1 else 1e-9
+    inside = np.flatnonzero((values >= low - tolerance) & (values <= high + tolerance))
+    if len(inside) == 0:
+        raise ValueError(f"Keine Gitterpunkte zwischen {low} und {high} (Gitter {values[0]} bis {values[-1]})")
+    return slice(int(inside[0]), int(inside[-1]) + 1)
+
+
+def bbox_slices(ds, bbox):
+    # (lat-Slice, lon-Slice) für bbox = (lat_min, lat_max, lon_min, lon_max); None: ganzes Gebiet.
+    # Liest nur die Koordinaten, nicht die Felder
+    if bbox is None:
+        return slice(None), slice(None)
+    lat_min, lat_max, lon_min, lon_max = bbox
+    return (_axis_slice(ds["latitude"].values, lat_min, lat_max),
+            _axis_slice(ds["longitude"].values, lon_min, lon_max))
+
+
+def iter_fields(ds, variable, lat_slice, lon_slice):
+    # Feld für Feld (ein Zeitschritt = eine GRIB-Nachricht) lesen und zuschneiden;
+    # im Speicher liegt nie mehr als ein Zeitschritt
+    data = ds[variable].isel(latitude=lat_slice, longitude=lon_slice)
+    steps = data.sizes.get("step")
+    for step in range(steps) if steps is not None else [None]:
+        field = data if step is None else data.isel(step=step)
+        yield field.values
+
+
+def _iso_times(values):
+    return [np.datetime_as_string(t, unit="s") + "Z" for t in np.atleast_1d(values)]
+
+
+def write_grid(ds, variable, bbox, path, compress=True):
+    # Ausschnitt bbox einer Variable quantisiert und (optional) komprimiert nach path schreiben
+    lat_slice, lon_slice = bbox_slices(ds, bbox)
+    units = ds[variable].attrs.get("units")
+    with instrumentation.stage("crop_write", station=variable) as record:
+        result = grid_format.write(
+            path, variable, iter_fields(ds, variable, lat_slice, lon_slice),
+            ds["latitude"].values[lat_slice], ds["longitude"].values[lon_slice],
+            _iso_times(ds["valid_time"].values), QUANTIZATION[variable],
+            compress=compress, attrs={"units": units} if units else None,
+        )
+        record["file_bytes"] = result.file_bytes
+    if result.clipped:
+        print(f"Warnung: {result.clipped} Werte von {variable} außerhalb des Wertebereichs abgeschnitten")
+    print(f"{path}: {result.shape}, {result.raw_bytes / 1024:.0f} KB roh, {result.file_bytes / 1024:.0f} KB Datei")
+    return result
+
+
+def _crop_matches(bbox, path):
+    # Passt der geschriebene Ausschnitt noch zu bbox? Sonst muss neu geschrieben werden,
+    # auch wenn sich die DWD-Dateien nicht geändert haben
+    if bbox is None:
+        return True
+    try:
+        latitudes, longitudes = grid_format.axes(grid_format.read_header(path))
+    except (OSError, ValueError, KeyError):
+        return False
+    lat_min, lat_max, lon_min, lon_max = bbox
+    step = abs(latitudes[1] - latitudes[0]) if len(latitudes) > 1 else 0
+    return (abs(min(latitudes) - lat_min) < step and abs(max(latitudes) - lat_max) < step
+            and abs(min(longitudes) - lon_min) < step and abs(max(longitudes) - lon_max) < step)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lädt UV-Index und gefühlte Temperatur des DWD und schreibt die Gitter nach docs/data")
+    parser.add_argument("--bbox", nargs=4, type=float, default=GFT_BBOX, metavar=("LAT_MIN", "LAT_MAX", "LON_MIN", "LON_MAX"),
+                        help="Ausschnitt für die gefühlte Temperatur (Standard: %(default)s)")
+    parser.add_argument("--uv-bbox", nargs=4, type=float, default=UV_BBOX, metavar=("LAT_MIN", "LAT_MAX", "LON_MIN", "LON_MAX"),
+                        help="Ausschnitt für den UV-Index (Standard: ganzes Gebiet)")
+    parser.add_argument("--no-deflate", dest="compress", action="store_false", help="Gitter unkomprimiert schreiben")
+    args = parser.parse_args(argv)
+    bboxes = {"gft": args.bbox, "uvi": args.uv_bbox, "uvh": args.uv_bbox}
+
     download_folder = "./downloads"
     os.makedirs(download_folder, exist_ok=True)
 
     # Dateien herunterladen
     file_paths = download_all_dwd_types(download_folder)
 
-
-
-
-
-    if all(file_paths.values()):
-        # Dateien mit xarray öffnen
-        gft = xr.open_dataset(file_paths["gft"], engine='cfgrib')
-        uvh = xr.open_dataset(file_paths["uvh"], engine='cfgrib')
-        uvi = xr.open_dataset(file_paths["uvi"], engine='cfgrib')
-
-    else:
+    if not all(file_paths.values()):
         print("error: Nicht alle Dateien konnten heruntergeladen werden.", f"files: {file_paths}")
+        return
+
+    if not any(r.changed for r in file_paths.values()) and all(os.path.exists(p) for p in OUTPUT_FILES) \
+            and all(_crop_matches(bboxes[typ], path) for typ, _, path in GRIDS):
+        print("DWD-Dateien unverändert, nichts zu tun.")
+        return
+
+    # Dateien mit xarray öffnen; gelesen werden beim Öffnen nur Index und Koordinaten,
+    # die Felder erst Zeitschritt für Zeitschritt beim Schreiben
+    os.makedirs(DATA_DIR, exist_ok=True)
+    for typ, variable, path in GRIDS:
+        with instrumentation.stage("open", station=typ):
+            ds = xr.open_dataset(file_paths[typ].path, engine='cfgrib')
+        try:
+            write_grid(ds, variable, bboxes[typ], path, compress=args.compress)
+        finally:
+            ds.close()
 
 
-    #Daten speichern 
-    with open("docs/data/latitudes_gft.json", "w") as f:
-        json.dump(gft['latitude'].values[200:-232].tolist(), f)
-        
-    with open("docs/data/longitudes_gft.json", "w") as f:
-        json.dump(gft['longitude'].values[450:-677].tolist(), f)
-        
-    with open("docs/data/latitudes_uv.json", "w") as f:
-        json.dump(uvi['latitude'].values.tolist(), f)
-        
-    with open("docs/data/longitudes_uv.json", "w") as f:
-        json.dump(uvi['longitude'].values.tolist(), f)
-        
-    with open("docs/data/data_gft.bin", "wb") as f:
-        f.write(gft['PT1M'].values[:, 200:-232, 450:-677].tobytes())
-        
-    with open("docs/data/data_uvi.bin", "wb") as f:
-        f.write(uvi['UVI_MAX_CL'].values.tobytes())
-        
-    with open("docs/data/data_uvh.bin", "wb") as f:
-        f.write(uvh['UVI_MAX_H'].values.tobytes())
-        
-        
-    # Konvertiere numpy datetime64-Array in Liste von ISO-Strings
-    times_str_gft = [str(t) for t in gft['valid_time'].values]
-    with open("docs/data/gft_forecast_times.json", "w") as f:
-        json.dump(times_str_gft, f)
-
-
-    # Konvertiere numpy datetime64-Array in Liste von ISO-Strings
-    times_str_uvi = [str(t) for t in uvi['valid_time'].values]
-    with open("docs/data/uvi_forecast_times.json", "w") as f:
-        json.dump(times_str_uvi, f)
-
 if __name__ == "__main__":
-    main()
+    instrumentation.start_run("process_dwd_uv_and_pt")
+    try:
+        main()
+    finally:
+        print(instrumentation.format_summary(instrumentation.finish_run()))
 
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+import mosmix_kml
+
+INDEX_FILE = Path(__file__).parent / "data" / "station_index.json"
+
+EARTH_RADIUS_M = 6371000.0
+
+RECORD_KEYS = ("station_id", "description", "lon", "lat", "height")
+
+
+def station_fingerprint(stations):
+    # Ändert sich nur, wenn sich die Stationsliste (Reihenfolge, IDs, Lage) ändert
+    h = hashlib.sha1()
+    for s in stations:
+        h.update(f"{s['station_id']}|{s['description']}|{s['lon']}|{s['lat']}|{s['height']}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _cartesian(lon, lat, height):
+    # Erdfeste kartesische Koordinaten in Metern, damit der KD-Baum echte Abstände sieht
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    r = EARTH_RADIUS_M + np.asarray(height, dtype=np.float64)
+    return np.column_stack((r * np.cos(lat) * np.cos(lon), r * np.cos(lat) * np.sin(lon), r * np.sin(lat)))
+
+
+class StationIndex:
+    # Name → Stations-ID → Offset (Position des Placemarks in der KML bzw. Zeile im Würfel)
+    # plus KD-Baum über lon/lat/Höhe für die Suche nach der nächsten Station.
+
+    def __init__(self, stations, fingerprint=None):
+        self.stations = [{k: s[k] for k in RECORD_KEYS} for s in stations]
+        self.fingerprint = fingerprint or station_fingerprint(self.stations)
+        self.offsets_by_id = {}
+        self.ids_by_name = {}
+        for offset, s in enumerate(self.stations):
+            self.offsets_by_id.setdefault(s["station_id"], offset)
+            self.ids_by_name.setdefault(s["description"], s["station_id"])
+        self._tree = None
+
+    def __len__(self):
+        return len(self.stations)
+
+    def __contains__(self, key):
+        return key in self.offsets_by_id or key in self.ids_by_name
+
+    def offset(self, key):
+        # key: Stations-ID oder Stationsname
+        station_id = key if key in self.offsets_by_id else self.ids_by_name.get(key)
+        if station_id is None:
+            raise KeyError(f"Station '{key}' nicht gefunden.")
+        return self.offsets_by_id[station_id]
+
+    def lookup(self, key):
+        offset = self.offset(key)
+        return dict(self.stations[offset], offset=offset)
+
+    @property
+    def tree(self):
+        # scipy nur laden, wenn tatsächlich nach Koordinaten gesucht wird
+        if self._tree is None:
+            from scipy.spatial import cKDTree
+            points = _cartesian(
+                [s["lon"] for s in self.stations],
+                [s["lat"] for s in self.stations],
+                [s["height"] for s in self.stations],
+            )
+            self._tree = cKDTree(points)
+        return self._tree
+
+    def nearest(self, lat, lon, height=0.0, k=1):
+        # Liefert die k nächsten Stationen mit Abstand in Metern, nächste zuerst
+        distances, offsets = self.tree.query(_cartesian([lon], [lat], [height])[0], k=k)
+        distances = np.atleast_1d(distances)
+        offsets = np.atleast_1d(offsets)
+        return [
+            dict(self.stations[int(o)], offset=int(o), distance_m=float(d))
+            for d, o in zip(distances, offsets)
+            if o < len(self.stations)
+        ]
+
+    def save(self, path=INDEX_FILE):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": self.fingerprint, "stations": self.stations}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def load_index(path=INDEX_FILE):
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return StationIndex(data["stations"], fingerprint=data["fingerprint"])
+
+
+def load_or_build(stations, path=INDEX_FILE):
+    # Gespeicherten Index wiederverwenden, solange sich die Stationsliste nicht geändert hat
+    index = load_index(path)
+    fingerprint = station_fingerprint(stations)
+    if index is not None and index.fingerprint == fingerprint:
+        return index
+    index = StationIndex(stations, fingerprint=fingerprint)
+    index.save(path)
+    return index
+
+
+def build_from_kml(kml_stream, path=INDEX_FILE):
+    stations = [{k: station[k] for k in RECORD_KEYS} for _, station in mosmix_kml.iter_placemarks(kml_stream, forecasts=False)]
+    return load_or_build(stations, path)
@@ -0,0 +1,156 @@
+import os
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+import station_index
+
+# Sonnenauf- und -untergang für viele Stationen und Tage in einem
+# NumPy-Durchlauf (NOAA-Verfahren wie astral). Die Tabelle wird
+# pro Starttag unter TABLE_DIR abgelegt und bei gleicher Stationsliste
+# wiederverwendet.
+TABLE_DIR = Path(__file__).parent / "data" / "sun_tables"
+
+BERLIN = ZoneInfo("Europe/Berlin")
+
+# Sonnenmittelpunkt unter dem Horizont wie bei astral: Radius der
+# Sonnenscheibe (16') plus Refraktion in dieser Höhe (0.5224°)
+ZENITH = 90.0 + 16 / 60 + 0.5224
+
+JD_UNIX_EPOCH = 2440587.5
+JD_J2000 = 2451545.0
+
+
+def _julian_century(jd):
+    return (jd - JD_J2000) / 36525.0
+
+
+def _declination_and_eqtime(t):
+    # Deklination (Radiant) und Zeitgleichung (Minuten) für Julianische Jahrhunderte t
+    l0 = np.radians((280.46646 + t * (36000.76983 + t * 0.0003032)) % 360)
+    m = np.radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+    e = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+    center = (np.sin(m) * (1.914602 - t * (0.004817 + 0.000014 * t))
+              + np.sin(2 * m) * (0.019993 - 0.000101 * t)
+              + np.sin(3 * m) * 0.000289)
+    omega = np.radians(125.04 - 1934.136 * t)
+    apparent_long = np.radians(np.degrees(l0) + center - 0.00569 - 0.00478 * np.sin(omega))
+    mean_obliq = 23 + (26 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60) / 60
+    obliq = np.radians(mean_obliq + 0.00256 * np.cos(omega))
+
+    declination = np.arcsin(np.sin(obliq) * np.sin(apparent_long))
+    y = np.tan(obliq / 2) ** 2
+    eqtime = 4 * np.degrees(
+        y * np.sin(2 * l0) - 2 * e * np.sin(m) + 4 * e * y * np.sin(m) * np.cos(2 * l0)
+        - 0.5 * y * y * np.sin(4 * l0) - 1.25 * e * e * np.sin(2 * m)
+    )
+    return declination, eqtime
+
+
+def _event_minutes(lat, lon, jd_day, direction):
+    # Ereigniszeit in Minuten nach 0 Uhr UTC; direction -1: Aufgang, +1: Untergang.
+    # Zweiter Durchlauf mit Sonnenstand zur Zeit des ersten Schätzwerts.
+    # NaN, wenn die Sonne an dem Tag nicht auf- oder untergeht.
+    minutes = 720.0 - 4 * lon
+    for _ in range(2):
+        declination, eqtime = _declination_and_eqtime(_julian_century(jd_day + minutes / 1440.0))
+        with np.errstate(invalid="ignore"):
+            cos_ha = (np.cos(np.radians(ZENITH)) / (np.cos(lat) * np.cos(declination))
+                      - np.tan(lat) * np.tan(declination))
+            hour_angle = np.degrees(np.arccos(np.where(np.abs(cos_ha) <= 1, cos_ha, np.nan)))
+        minutes = 720.0 - 4 * lon - eqtime + direction * 4 * hour_angle
+    return minutes
+
+
+def compute(lats, lons, days):
+    # lats/lons: Grad je Station, days: Liste von datetime.date (UTC-Tage).
+    # Liefert (sunrise, sunset) als datetime64[s] in UTC, Form Stationen × Tage, NaT ohne Ereignis
+    lat = np.radians(np.asarray(lats, dtype=np.float64))[:, None]
+    lon = np.asarray(lons, dtype=np.float64)[:, None]
+    day_numbers = np.array([d.toordinal() - date(1970, 1, 1).toordinal() for d in days], dtype=np.float64)
+    jd_day = (JD_UNIX_EPOCH + day_numbers)[None, :]
+
+    result = []
+    for direction in (-1, 1):
+        minutes = _event_minutes(lat, lon, jd_day, direction)
+        seconds = np.rint((day_numbers[None, :] * 1440.0 + minutes) * 60)
+        times = np.full(seconds.shape, np.datetime64("NaT"), dtype="datetime64[s]")
+        valid = np.isfinite(seconds)
+        times[valid] = seconds[valid].astype(np.int64)
+        result.append(times)
+    return tuple(result)
+
+
+class SunTable:
+    # Auf- und Untergangszeiten Station × Tag; Zeilen in derselben Reihenfolge
+    # wie die Stationsliste, Nachschlagen über Stations-ID oder Name
+
+    def __init__(self, stations, days, sunrise, sunset, fingerprint=None):
+        self.index = station_index.StationIndex(stations, fingerprint=fingerprint)
+        self.days = list(days)
+        self.sunrise = sunrise
+        self.sunset = sunset
+
+    def station(self, key, tz=BERLIN):
+        # dict lokales Datum → {"sunrise": datetime, "sunset": datetime}; fehlt ein
+        # Ereignis (Polartag/-nacht), fehlt der Schlüssel
+        offset = self.index.offset(key)
+        table = {}
+        for i in range(len(self.days)):
+            events = {}
+            for event, times in (("sunrise", self.sunrise), ("sunset", self.sunset)):
+                value = times[offset, i]
+                if not np.isnat(value):
+                    utc = datetime.fromtimestamp(value.astype(np.int64), tz=timezone.utc)
+                    events[event] = utc.astimezone(tz)
+            for event, local in events.items():
+                table.setdefault(local.date(), {})[event] = local
+        return table
+
+
+def _table_path(first_day, table_dir):
+    return Path(table_dir) / f"{first_day.isoformat()}.npz"
+
+
+def build(stations, first_day, num_days):
+    days = [first_day + timedelta(days=i) for i in range(num_days)]
+    lats = [s["lat"] for s in stations]
+    lons = [s["lon"] for s in stations]
+    sunrise, sunset = compute(lats, lons, days)
+    return SunTable(stations, days, sunrise, sunset)
+
+
+def load_or_build(stations, first_day=None, num_days=3, table_dir=TABLE_DIR):
+    # Tabelle ab first_day (Standard: heute) für num_days Tage; abgelegt wird
+    # pro Starttag, neu gerechnet nur bei geänderter Stationsliste oder Tagesanzahl
+    first_day = first_day or date.today()
+    fingerprint = station_index.station_fingerprint(stations)
+    return _load_or_build(tuple(tuple(s[k] for k in station_index.RECORD_KEYS) for s in stations),
+                          fingerprint, first_day, num_days, str(table_dir))
+
+
+@lru_cache(maxsize=4)
+def _load_or_build(records, fingerprint, first_day, num_days, table_dir):
+    stations = [dict(zip(station_index.RECORD_KEYS, r)) for r in records]
+    path = _table_path(first_day, table_dir)
+    try:
+        with np.load(path) as data:
+            if str(data["fingerprint"]) == fingerprint and len(data["sunrise"][0]) == num_days:
+                return SunTable(stations, [first_day + timedelta(days=i) for i in range(num_days)],
+                                data["sunrise"], data["sunset"], fingerprint=fingerprint)
+    except (OSError, KeyError, ValueError, IndexError):
+        pass
+
+    table = build(stations, first_day, num_days)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp.npz")
+    np.savez(tmp_path, fingerprint=np.array(fingerprint), sunrise=table.sunrise, sunset=table.sunset)
+    os.replace(tmp_path, path)
+    # Tabellen älterer Tage entfernen
+    for old in path.parent.glob("*.npz"):
+        if old.name < path.name:
+            old.unlink(missing_ok=True)
+    return table
@@ -0,0 +1,77 @@
+import time
+from collections import namedtuple
+from io import BytesIO
+
+import instrumentation
+
+# Ausgabeformate für die Widgets. Angabe als "<Name>" oder "<Name>:<Stufe>":
+#   png             verlustfrei, Stufe = zlib-Kompression 0-9 (Standard 6)
+#   png-optimize    wie png, zusätzlich optimize=True (langsamer, kleiner)
+#   png-palette     auf max. 256 Farben quantisiert, Stufe = zlib-Kompression
+#   webp-lossless   verlustfrei, Stufe = method 0-6 (höher: kleiner, langsamer)
+#   webp            verlustbehaftet, Stufe = quality 0-100
+Encoder = namedtuple("Encoder", ["name", "format", "suffix", "mime", "level"])
+
+ENCODERS = {
+    "png": ("PNG", ".png", "image/png", 6),
+    "png-optimize": ("PNG", ".png", "image/png", 9),
+    "png-palette": ("PNG", ".png", "image/png", 9),
+    "webp-lossless": ("WEBP", ".webp", "image/webp", 4),
+    "webp": ("WEBP", ".webp", "image/webp", 85),
+}
+DEFAULT_ENCODER = "png"
+PALETTE_COLORS = 256
+
+EncodeResult = namedtuple("EncodeResult", ["encoder", "size", "seconds"])
+
+
+def encoder_from_spec(spec=DEFAULT_ENCODER):
+    name, _, level = spec.partition(":")
+    if name not in ENCODERS:
+        raise ValueError(f"Unbekanntes Ausgabeformat {name!r}, erwartet: {', '.join(ENCODERS)}")
+    image_format, suffix, mime, default_level = ENCODERS[name]
+    return Encoder(name, image_format, suffix, mime, int(level) if level else default_level)
+
+
+def _save_options(encoder):
+    if encoder.name == "png":
+        return {"compress_level": encoder.level}
+    if encoder.name in ("png-optimize", "png-palette"):
+        return {"compress_level": encoder.level, "optimize": encoder.name == "png-optimize"}
+    if encoder.name == "webp-lossless":
+        return {"lossless": True, "quality": 100, "method": encoder.level}
+    return {"quality": encoder.level, "method": 4}
+
+
+def _prepare(img, encoder):
+    if encoder.name == "png-palette":
+        from PIL import Image
+
+        # FASTOCTREE kann als einziges Verfahren RGBA quantisieren
+        return img.quantize(colors=PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+    return img
+
+
+@instrumentation.timed("encode")
+def encode(img, encoder):
+    # Liefert (Bytes, EncodeResult); die Zeit umfasst Quantisieren und Kodieren
+    if isinstance(encoder, str):
+        encoder = encoder_from_spec(encoder)
+    start = time.perf_counter()
+    buf = BytesIO()
+    _prepare(img, encoder).save(buf, format=encoder.format, **_save_options(encoder))
+    data = buf.getvalue()
+    return data, EncodeResult(encoder, len(data), time.perf_counter() - start)
+
+
+def save(img, path, encoder):
+    # Bild kodieren und schreiben; die Endung von path (encoder.suffix) legt der Aufrufer fest
+    data, result = encode(img, encoder)
+    with open(path, "wb") as f:
+        f.write(data)
+    return result
+
+
+def format_result(result):
+    return (f"{result.encoder.name}:{result.encoder.level} "
+            f"{result.size / 1024:7.1f} KB in {result.seconds * 1000:6.1f} ms")
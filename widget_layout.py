@@ -0,0 +1,337 @@
+import hashlib
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from matplotlib import colormaps
+from matplotlib.colors import Normalize
+from PIL import Image, ImageDraw, ImageFont
+
+import widget_render
+
+# Layout eines Widgets: pro Stunde werden die Elemente einmal in normierten
+# Koordinaten berechnet (x in Pixeln ab Reihenanfang, y als Anteil der
+# Bildhöhe). Daraus wird jede Ausgabegröße (Profil) nur noch gerastert.
+
+ICON_DIR = Path(__file__).parent / "icons"
+ICON_PATHS = {
+    "arrow": ICON_DIR / "right-arrow.png",
+    "sunrise": ICON_DIR / "sunrise.png",
+    "sunset": ICON_DIR / "sunset.png",
+    "fog": ICON_DIR / "fog.png",
+    "rain": ICON_DIR / "rain.png",
+    "thunderstorm": ICON_DIR / "thunderstorm.png",
+}
+
+WIDTH_PER_HOUR = 50  # muss angepasst werden auf 25 wenn anstatt von 24 48 stunden gezeigt werden sollen
+DPI = 150
+ROW_THREADS = 2  # beide Reihen eines Widgets gleichzeitig
+
+# Erhöhen, sobald sich Layout oder Rendering ändern: alle Widgets werden dann
+# beim nächsten Lauf neu erzeugt, auch wenn die Vorhersage gleich geblieben ist
+LAYOUT_VERSION = 1
+
+# "raster": Kurve direkt in Zielgröße rastern; "matplotlib": Referenz über
+# widget_render.render_curve, einmal gerendert und pro Profil skaliert
+CURVE_BACKENDS = ("raster", "matplotlib")
+
+# Ausgabegröße: Höhe = Breite/360 * aspect, dazu die Größe der
+# Bewölkungskreise und der Sichtweitenpunkte
+Profile = namedtuple("Profile", ["name", "aspect", "pie_size", "circle_radius"])
+LARGE = Profile("large", 188, 38, 5)
+SMALL = Profile("small", 168, 28, 4)
+
+# Deutsche Wochentagskürzel
+WOCHENTAGE = ['Mo', 'Di', 'Mi', 'Do', 'Fr', 'Sa', 'So']
+
+WW_FOG = [45, 49]
+WW_SHOWER = [81, 82]
+WW_THUNDERSTORM = 95
+WW_ICONS = WW_FOG + WW_SHOWER + [WW_THUNDERSTORM]
+
+SUN_COLOR = "rgb(236, 87, 0)"
+
+# Colormap für Wind
+WIND_NORM = Normalize(vmin=0, vmax=35)
+WIND_COLORMAP = colormaps['gist_heat_r']
+GUST_NORM = Normalize(vmin=0, vmax=50)
+GUST_COLORMAP = colormaps['Reds']
+
+
+def profile_height(profile, width):
+    return int((width/360) * profile.aspect)
+
+
+def icon_size(width_per_hour, height):
+    return (int(width_per_hour*0.66), int(height*0.1*0.66))
+
+
+_local = threading.local()
+_row_executor = None
+
+
+def _fonts():
+    # Fonts pro Thread laden, FreeType-Fonts dürfen nicht gleichzeitig aus
+    # mehreren Threads benutzt werden
+    fonts = getattr(_local, "fonts", None)
+    if fonts is None:
+        fonts = _local.fonts = (ImageFont.load_default(size=18), ImageFont.load_default(size=21))
+    return fonts
+
+
+def _rain_color(rain_intensity):
+    if rain_intensity < 2:
+        return "#6dc6f7"
+    elif rain_intensity < 7:
+        return "#1f78b4"
+    elif rain_intensity < 15:
+        return "#33a02c"
+    elif rain_intensity < 25:
+        return "#f9301a"
+    return "#b20003"
+
+
+def layout_row(df, sun_times, width_per_hour=WIDTH_PER_HOUR):
+    # Liefert die Zeichenoperationen einer Reihe in Zeichenreihenfolge:
+    #   ("text", x, y, text, bold, fill)         y = h - h*y
+    #   ("rect", x0, x1, y_top, y_bottom, fill)
+    #   ("line", x)
+    #   ("circle", x, y, fill)                   Radius aus dem Profil
+    #   ("icon", name, x, y, stacked)            Mitte bei h - int(h*y), stacked: unter dem Wetter-Icon
+    #   ("arrow", x, y, grad)
+    #   ("pie", x, y, neff)                      Größe aus dem Profil
+    # sun_times: dict lokales Datum → {"sunrise": datetime, "sunset": datetime}
+    # (sun_table.SunTable.station), Auf- und Untergang gelten für den Tag der Stunde
+    temp_max = df['TTT_x'].max()
+    temp_min = df['TTT_x'].min()
+
+    ops = []
+    gut = sehr_gut = False
+    x0 = 0
+    for i, row in df.iterrows():
+        x0 = i * width_per_hour
+        x_mid = x0 + width_per_hour // 2
+
+        # Wetter icons
+        if row['ww_x'] in WW_FOG:      # Nebel warnung
+            ops.append(("icon", "fog", x_mid, 0.77, False))
+        if row['ww_x'] in WW_SHOWER:      # mäßige und äußerst hefitge regenshauer
+            ops.append(("icon", "rain", x_mid, 0.77, False))
+        if row['ww_x'] == WW_THUNDERSTORM:      # Gewitter
+            ops.append(("icon", "thunderstorm", x_mid, 0.77, False))
+
+        zeit = pd.to_datetime(row['Zeit'])  # Falls Zeit als String vorliegt
+        stunde = zeit.hour
+
+        # Wenn Stunde 00 ist → Wochentagskürzel anzeigen und Sonnenauf- und -untergang
+        if stunde == 0:
+            label = WOCHENTAGE[zeit.weekday()]
+        else:
+            events = sun_times.get(zeit.date(), {})
+            for event in ("sunrise", "sunset"):
+                if event in events and stunde == events[event].hour:
+                    ops.append(("text", x0 + 3, 0.93, events[event].strftime('%H:%M'), False, SUN_COLOR))
+                    ops.append(("icon", event, x_mid, 0.77, row['ww_x'] in WW_ICONS))
+                    break
+            label = f"{stunde:02d}h"
+
+        # Uhrzeit oder Wochentag zeichnen
+        ops.append(("text", x0 + 8, 0.98, label, True, "navy"))
+
+        # Temperatur (Zahl)
+        if row['TTT_x'] == temp_max:
+            temp_color = "rgb(219, 11, 11)"
+        elif row['TTT_x'] == temp_min:
+            temp_color = "rgb(13, 27, 181)"
+        else:
+            temp_color = "black"
+        ops.append(("text", x0 + 10, 0.66, f"{row['TTT_x']}°", True, temp_color))
+
+        # Regendaten (Zahl)
+        if row['RR1c_x'] != 0:
+            ops.append(("text", x0 + 11, 0.50, f"{row['RR1c_x']}", True, "black"))
+        if row['RR1c_x'] != 0 and row['DRR1'] != 0:
+            ops.append(("text", x0 + 14, 0.45, f"{int(row['DRR1']/60)}", True, "black"))
+            rain_intensity = (row['RR1c_x']/row['DRR1'])*3600
+            ops.append(("text", x0 + 14, 0.40, f"{round(rain_intensity)}", True, _rain_color(rain_intensity)))
+        if row['wwP'] >= 10:
+            ops.append(("text", x0 + 6, 0.35, f"{int(row['wwP'])}%", True, "black"))
+
+        # Wind-Kästchen average farbig
+        wind_color = tuple((np.array(WIND_COLORMAP(WIND_NORM(row['FF_x']))[:3]) * 255).astype(int))
+        ops.append(("rect", x0, x0 + width_per_hour, 0.3, 0.2, wind_color))
+        ops.append(("text", x0 + 14, 0.27, f"{row['FF_x']}", True, "lightgrey"))
+
+        # Wind max
+        wind_color = tuple((np.array(GUST_COLORMAP(GUST_NORM(row['FX1_x']))[:3]) * 255).astype(int))
+        ops.append(("rect", x0, x0 + width_per_hour, 0.2, 0.1, wind_color))
+        ops.append(("text", x0 + 14, 0.17, f"{row['FX1_x']}", True, "black"))
+
+        # Windrichtungspfeil (aus u/v)
+        ops.append(("arrow", x_mid, 0.05, row['DD_x']))
+
+        # Linien zu besseren Zuordnung
+        ops.append(("line", x0))
+
+        # Wolkenbedeckung
+        ops.append(("pie", x_mid, 0.85, row['Neff_x']))
+
+        # Sichtweite ? parameter setzten
+        gut = 90000 <= row['VV_x'] < 120000
+        sehr_gut = 120000 <= row['VV_x']
+        if gut:
+            ops.append(("circle", x_mid, 0.85, SUN_COLOR))
+        if sehr_gut:
+            ops.append(("circle", x_mid, 0.85, "rgb(255,0,0)"))
+
+    # Hinweis nach der Sichtweite der letzten Stunde
+    if gut:
+        ops.append(("text", x0, 0.93, "Gute Sicht", True, SUN_COLOR))
+    if sehr_gut:
+        ops.append(("text", x0, 0.93, "Sehr gute Sicht!", True, "rgb(255,0,0)"))
+    return ops
+
+
+def rasterize(ops, curve_img, width, profile, width_per_hour=WIDTH_PER_HOUR):
+    # Eine Reihe in der Größe des Profils zeichnen; curve_img hat bereits die
+    # Zielgröße (Breite × halbe Höhe)
+    height = profile_height(profile, width)
+    font, font_bold = _fonts()
+    size = icon_size(width_per_hour, height)
+    icon_gap = widget_render.icon(ICON_PATHS["fog"], size).size[1] + 2
+
+    # Basisbild erstellen, Kurve 20% unter dem oberen Rand einfügen
+    base_img = Image.new("RGBA", (width, height), "lightgrey")
+    base_img.paste(curve_img, (0, int(height * 0.2)), curve_img)
+    draw = ImageDraw.Draw(base_img)
+
+    for op in ops:
+        kind = op[0]
+        if kind == "text":
+            _, x, y, text, bold, fill = op
+            draw.text((x, height - (height*y)), text, font=font_bold if bold else font, fill=fill)
+        elif kind == "rect":
+            _, x0, x1, y_top, y_bottom, fill = op
+            draw.rectangle([x0, height - (height*y_top), x1, height - (height*y_bottom)], fill=fill)
+        elif kind == "line":
+            draw.line([op[1], height, op[1], 0], fill='grey', width=0)
+        elif kind == "circle":
+            _, x, y, fill = op
+            draw.circle((x, height - (height*y)), radius=profile.circle_radius, fill=fill)
+        elif kind == "icon":
+            _, name, x, y, stacked = op
+            sprite = widget_render.icon(ICON_PATHS[name], size)
+            y_target = height - int(height * y) + (icon_gap if stacked else 0)
+            base_img.paste(sprite, (x - sprite.size[0] // 2, y_target - sprite.size[1] // 2), sprite)
+        elif kind == "arrow":
+            _, x, y, grad = op
+            sprite = widget_render.wind_arrow(ICON_PATHS["arrow"], size, grad)
+            # der Mittelpunkt des rotierten Pfeils wird (wie bisher) über die Breite bestimmt
+            y_target = height - int(height * y)
+            base_img.paste(sprite, (x - sprite.size[0] // 2, y_target - sprite.size[0] // 2), sprite)
+        elif kind == "pie":
+            _, x, y, neff = op
+            sprite = widget_render.cloud_pie(neff, profile.pie_size)
+            y_target = height - int(height * y)
+            base_img.paste(sprite, (x - sprite.size[0] // 2, y_target - sprite.size[1] // 2), sprite)
+        else:
+            raise ValueError(f"Unbekannte Zeichenoperation {kind!r}")
+    return base_img
+
+
+def render_curves(df, width, heights, width_per_hour=WIDTH_PER_HOUR, dpi=DPI, curve_backend="raster"):
+    # Regen- und Temperaturkurve für jede Höhe in heights; liefert dict
+    # Höhe → RGBA-Bild der Größe Breite × halbe Höhe
+    monat = int(pd.to_datetime(df['Zeit'][0]).strftime("%m"))
+    if curve_backend == "raster":
+        return {h: widget_render.render_curve_raster(df['TTT_x'], df['RR1c_x'], monat, width, h // 2)
+                for h in heights}
+    if curve_backend == "matplotlib":
+        reference = widget_render.render_curve(df['TTT_x'], df['RR1c_x'], monat, width, max(heights),
+                                               width_per_hour, dpi=dpi)
+        return {h: reference.resize((width, h // 2), Image.Resampling.LANCZOS) for h in heights}
+    raise ValueError(f"Unbekanntes Kurven-Backend {curve_backend!r}, erwartet: {', '.join(CURVE_BACKENDS)}")
+
+
+def render_row(df, sun_times, profiles, width_per_hour=WIDTH_PER_HOUR, dpi=DPI, curve_backend="raster"):
+    # Layout einmal berechnen, dann pro Profil nur Kurve und Elemente rastern.
+    # Liefert dict Profilname → RGBA-Bild.
+    width = width_per_hour * len(df)
+    heights = {p.name: profile_height(p, width) for p in profiles}
+    curves = render_curves(df, width, set(heights.values()), width_per_hour, dpi, curve_backend)
+
+    ops = layout_row(df, sun_times, width_per_hour)
+    return {p.name: rasterize(ops, curves[heights[p.name]], width, p, width_per_hour) for p in profiles}
+
+
+def compose_rows(rows, separator_width=5):
+    # Reihen untereinander in eine vorab angelegte Leinwand einfügen, mit
+    # schwarzer Trennlinie zwischen den Reihen
+    width = max(row.width for row in rows)
+    canvas = Image.new("RGBA", (width, sum(row.height for row in rows)), (0, 0, 0, 0))
+    offsets = []
+    y = 0
+    for row in rows:
+        canvas.paste(row, (0, y))
+        offsets.append(y)
+        y += row.height
+
+    draw = ImageDraw.Draw(canvas)
+    for y in offsets[1:]:
+        draw.line([0, y, width, y], fill='black', width=separator_width)
+    return canvas
+
+
+def _rows_executor():
+    # Threads pro Prozess, die über alle Stationen erhalten bleiben
+    # (und mit ihnen die pro Thread geladenen Fonts)
+    global _row_executor
+    if _row_executor is None:
+        _row_executor = ThreadPoolExecutor(max_workers=ROW_THREADS, thread_name_prefix="widget-row")
+    return _row_executor
+
+
+def _reset_rows_executor():
+    # Nach fork() gibt es die Threads des Elternprozesses nicht mehr
+    global _row_executor
+    _row_executor = None
+
+
+def warm_row_threads():
+    # Zeilen-Threads starten und dort die Fonts laden
+    executor = _rows_executor()
+    for future in [executor.submit(_fonts) for _ in range(ROW_THREADS)]:
+        future.result()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_rows_executor)
+
+
+def render_hash(df_1, df_2, sun_times, width_per_hour=WIDTH_PER_HOUR, curve_backend="raster", output=""):
+    # Fingerabdruck aller Eingaben der beiden Widgets einer Station: beide
+    # Reihen (Spalten, Index und Werte), Sonnenauf- und -untergang, Layoutversion.
+    # output: beliebige Beschreibung des Ausgabeformats (z.B. "webp:85")
+    digest = hashlib.sha256(f"{LAYOUT_VERSION}|{width_per_hour}|{curve_backend}|{output}".encode())
+    for df in (df_1, df_2):
+        digest.update("|".join(map(str, df.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    for day in sorted(sun_times):
+        for event, time in sorted(sun_times[day].items()):
+            digest.update(f"|{day}:{event}={time.isoformat()}".encode())
+    return digest.hexdigest()
+
+
+def render_widgets(df_1, df_2, sun_times, width_per_hour=WIDTH_PER_HOUR, dpi=DPI, curve_backend="raster"):
+    # Kleines Widget (erste Reihe) und großes Widget (beide Reihen) einer
+    # Station komplett im Speicher; die beiden Reihen werden parallel gerendert.
+    # Liefert (kleines Widget, großes Widget) als RGBA-Bilder.
+    executor = _rows_executor()
+    erste = executor.submit(render_row, df_1, sun_times, [LARGE, SMALL], width_per_hour, dpi, curve_backend)
+    zweite = executor.submit(render_row, df_2, sun_times, [LARGE], width_per_hour, dpi, curve_backend)
+    erste_reihe, zweite_reihe = erste.result(), zweite.result()
+    return erste_reihe["small"], compose_rows([erste_reihe["large"], zweite_reihe["large"]])
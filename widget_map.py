@@ -0,0 +1,55 @@
+import folium
+from folium.plugins import FastMarkerCluster
+
+# Stationskarte: die Widgets werden nicht eingebettet, sondern als externe
+# Bilder referenziert und erst geladen, wenn ein Popup geöffnet wird. Die
+# Marker werden clientseitig aus einem Datenarray erzeugt und geclustert, so
+# bleiben auch alle MOSMIX-Stationen (einige Tausend) flüssig. Stationen ohne
+# Widget bekommen nur einen Tooltip.
+
+CENTER = (48.1374, 11.5755)  # München
+ZOOM_START = 13
+POPUP_WIDTH = 600
+
+# row: [lat, lon, Name, Bild-URL, Bildhöhe bei POPUP_WIDTH]; ohne Widget URL null
+_MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindTooltip("Station " + row[2]);
+    if (!row[3]) {
+        return marker;
+    }
+    marker.bindPopup(function () {
+        var img = document.createElement("img");
+        img.src = row[3];
+        img.width = %(width)d;
+        img.height = row[4];
+        img.alt = "Wettervorhersage " + row[2];
+        return img;
+    }, {maxWidth: %(max_width)d, maxHeight: %(max_height)d});
+    return marker;
+}
+"""
+
+
+def popup_height(image_size, width=POPUP_WIDTH):
+    # Höhe des Bildes im Popup, damit Leaflet das Popup schon vor dem Laden richtig platziert
+    image_width, image_height = image_size
+    return round(image_height * width / image_width)
+
+
+def build_map(markers, out_path, center=CENTER, zoom_start=ZOOM_START, max_height=367):
+    # markers: Liste von (Name, lat, lon, Bild-URL, Bildgröße (Breite, Höhe));
+    # Stationen ohne Widget mit URL und Größe None
+    m = folium.Map(location=list(center), zoom_start=zoom_start)
+    data = [[lat, lon, name, url, popup_height(size) if size else None] for name, lat, lon, url, size in markers]
+    callback = _MARKER_CALLBACK % {"width": POPUP_WIDTH, "max_width": POPUP_WIDTH + 50, "max_height": max_height}
+    FastMarkerCluster(data, callback=callback).add_to(m)
+    # Ausschnitt auf die Stationen mit Widget, nicht auf ganz Europa
+    focus = [row for row in data if row[3]] or data
+    if len(focus) > 1:
+        lats = [row[0] for row in focus]
+        lons = [row[1] for row in focus]
+        m.fit_bounds([[min(lats), min(lons)], [max(lats), max(lons)]])
+    m.save(out_path)
+    return out_path
@@ -0,0 +1,83 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+import widget_encode
+import widget_layout
+import widget_render
+
+# Rendern mehrerer Stationen auf einem Prozess-Pool. Jeder Worker lädt
+# matplotlib, Fonts, Colormaps und alle Sprites einmal beim Start und
+# behält sie für alle Stationen, die er danach bekommt.
+
+HOURS = 24
+
+
+def warm_up(width_per_hour=widget_layout.WIDTH_PER_HOUR, hours=HOURS):
+    # Initializer der Worker: alles, was sonst beim ersten Rendern anfällt
+    import matplotlib.pyplot  # noqa: F401  (Referenz-Backend)
+
+    widget_layout.WIND_COLORMAP(0.0)
+    widget_layout.GUST_COLORMAP(0.0)
+    width = width_per_hour * hours
+    profiles = (widget_layout.LARGE, widget_layout.SMALL)
+    sizes = [widget_layout.icon_size(width_per_hour, widget_layout.profile_height(p, width)) for p in profiles]
+    for path in widget_layout.ICON_PATHS.values():
+        for size in sizes:
+            widget_render.icon(path, size)
+    widget_render.warm_sprites(widget_layout.ICON_PATHS["arrow"], sizes, [p.pie_size for p in profiles])
+
+    widget_layout.warm_row_threads()
+
+
+def render_station(name, df_1, df_2, sun_times, small_path, large_path,
+                   encoder=widget_encode.DEFAULT_ENCODER, curve_backend="raster"):
+    # Job für einen Worker: beide Widgets einer Station rendern und speichern.
+    # Die Bilder bleiben im Worker, zurück gehen Name, Größe/Dauer der Encodes
+    # und die Messwerte der Stufen (für instrumentation.extend im Hauptprozess).
+    with instrumentation.recording() as records:
+        with instrumentation.stage("render", station=name):
+            small_widget, large_widget = widget_layout.render_widgets(df_1, df_2, sun_times, curve_backend=curve_backend)
+        # Jedes Encode ist eine eigene Stufe (instrumentation.timed in widget_encode)
+        small_result = widget_encode.save(small_widget, small_path, encoder)
+        large_result = widget_encode.save(large_widget, large_path, encoder)
+    return name, small_result, large_result, records
+
+
+def _worker_context():
+    # Kein fork: der Pool entsteht erst beim ersten submit, wenn im Hauptprozess schon
+    # Download-Threads (dwd_download.fetch_many) laufen. Hält einer davon beim fork eine
+    # Sperre (instrumentation, urllib3), bleibt der Worker daran hängen. Der Forkserver
+    # startet die Worker aus einem eigenen, thread-freien Prozess, der dieses Modul
+    # (matplotlib, PIL, widget_layout) schon importiert hat.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def render_pool(max_workers=None):
+    # max_workers: Anzahl Worker-Prozesse, None: ein Prozess pro Kern
+    max_workers = max_workers or os.cpu_count() or 1
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=warm_up, mp_context=_worker_context())
+
+
+def load_manifest(path):
+    # Render-Manifest des letzten Laufs: dict Stationsname → render_hash
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    path = os.fspath(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
@@ -0,0 +1,259 @@
+import threading
+from functools import lru_cache
+from io import BytesIO
+
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import Normalize
+from PIL import Image, ImageDraw
+from scipy.interpolate import PchipInterpolator, interp1d
+
+# Temperaturfläche: Basislinie und Skalierung in Datenkoordinaten der Kurvengrafik
+TEMP_BASE = 132
+TEMP_SCALE = 2.5
+
+# Regenfläche (nach oben zeigend von Basislinie)
+RAIN_BASE = 0
+RAIN_SCALE = 5
+
+DPI = 150
+FINE_STEPS = 500
+_PYPLOT_LOCK = threading.Lock()
+
+# Direktes Rastern: Wertebereich der y-Achse (wie ax.set_ylim in render_curve)
+# und Unterabtastung je Pixelspalte für die Kantenglättung
+Y_MAX = 220
+SUPERSAMPLE = 4
+RAIN_RGB = (0.0, 0.0, 1.0)
+RAIN_ALPHA = 0.3
+TEMP_ALPHA = 0.5
+
+
+def temperature_norm(monat):
+    # Farbnormalisierung basierend auf Temperatur (abhängig von jahreszeit)
+    if monat in [12, 1, 2]:  # Winter
+        return Normalize(vmin=-10, vmax=14)
+    elif monat in [3, 4, 5, 9, 10, 11]:  # Frühling und Herbst
+        return Normalize(vmin=-8.33, vmax=33.33)
+    else:  # Sommer
+        return Normalize(vmin=-7.33, vmax=36)
+
+
+def draw_temperature_band(ax, x_fine, temp_y, norm_temp, cmap_temp, width_per_hour,
+                          temp_base=TEMP_BASE, temp_scale=TEMP_SCALE):
+    # Farbverlauf unter der Temperaturkurve als eine einzige PolyCollection:
+    # ein Viereck pro x_fine-Segment, Farbe aus dem Mittelwert der Segmentenden.
+    # Ein Colormap-Aufruf und ein Zeichenaufruf statt ~500 fill_between.
+    # Unterschied zur Einzelvariante: fill_between mit nur einem Viereck zeichnet
+    # matplotlib über draw_markers auf ganze Pixel gerundet, die Collection bleibt
+    # subpixelgenau; Abweichungen gibt es daher nur in der Kantenglättung.
+    x = np.asarray(x_fine, dtype=np.float64) * width_per_hour
+    y = temp_base + np.asarray(temp_y, dtype=np.float64) * temp_scale
+    base = np.full(len(x) - 1, float(temp_base))
+
+    # Eckpunkte in derselben Reihenfolge wie fill_between sie anlegt
+    top_left = np.column_stack((x[:-1], y[:-1]))
+    top_right = np.column_stack((x[1:], y[1:]))
+    verts = np.stack([
+        top_left,
+        np.column_stack((x[:-1], base)),
+        np.column_stack((x[1:], base)),
+        top_right,
+        top_right,
+        top_left,
+    ], axis=1)
+
+    temp_y = np.asarray(temp_y, dtype=np.float64)
+    colors = cmap_temp(norm_temp((temp_y[:-1] + temp_y[1:]) / 2))
+    band = PolyCollection(verts, facecolors=colors, edgecolors=colors, linewidths=0, alpha=0.5)
+    ax.add_collection(band)
+    return band
+
+
+def draw_temperature_band_segments(ax, x_fine, temp_y, norm_temp, cmap_temp, width_per_hour,
+                                   temp_base=TEMP_BASE, temp_scale=TEMP_SCALE):
+    # Bisherige Variante (ein fill_between pro Segment), nur noch als Referenz
+    # für Vergleiche und Benchmarks
+    for i in range(len(x_fine) - 1):
+        x_segment = [x_fine[i] * width_per_hour, x_fine[i+1] * width_per_hour]
+        y_segment = [temp_base + temp_y[i] * temp_scale, temp_base + temp_y[i+1] * temp_scale]
+
+        color = cmap_temp(norm_temp((temp_y[i] + temp_y[i+1]) / 2))
+
+        ax.fill_between(
+            x_segment,
+            [temp_base, temp_base],
+            y_segment,
+            facecolor=color,
+            edgecolor=color,
+            linewidth=0,
+            alpha=0.5
+        )
+
+
+def render_curve(temperatures, rain, monat, width, height, width_per_hour, dpi=DPI,
+                 band_renderer=draw_temperature_band):
+    # Regen- und Temperaturkurve einer Reihe mit matplotlib zeichnen; liefert
+    # das auf den Inhalt zugeschnittene RGBA-Bild (noch nicht auf Zielgröße skaliert).
+    # Referenz für render_curve_raster
+    anzahl_std = len(temperatures) - 1
+
+    # Interpolation vorbereiten
+    x = list(range(0, anzahl_std + 1))
+    x_fine = np.linspace(min(x), max(x), FINE_STEPS)
+
+    # Temperaturkurve interpolieren
+    temp_interp = interp1d(x, temperatures, kind='cubic')
+    temp_y = temp_interp(x_fine)
+
+    # Regenkurve interpolieren mit PchipInterpolator
+    rain_interp = PchipInterpolator(x, rain)
+    rain_y = rain_interp(x_fine)
+
+    # pyplot ist nicht threadsicher: Reihen, die parallel gerendert werden,
+    # zeichnen ihre Figure nacheinander
+    with _PYPLOT_LOCK:
+        # Matplotlib-Zeichenfläche
+        fig, ax = plt.subplots(figsize=(width / dpi, height / dpi), dpi=dpi)
+        ax.axis('off')
+        plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
+
+        ax.fill_between(
+            x_fine * width_per_hour,
+            RAIN_BASE,
+            RAIN_BASE + rain_y * RAIN_SCALE,
+            edgecolor='navy',
+            facecolor='blue',
+            linewidth=0,
+            alpha=0.3
+        )
+
+        # Temperaturkurve mit Farbverlauf aus Colormap 'rainbow'
+        band_renderer(ax, x_fine, temp_y, temperature_norm(monat), colormaps['rainbow'], width_per_hour)
+
+        ax.set_ylim((0,220))
+        ax.plot([x_fine[0], x_fine[-1]], [220, 220], alpha=.1)
+        ax.plot([x_fine[0], x_fine[-1]], [0, 0], alpha=.1)
+        # In-Memory-Speicherung
+        buf = BytesIO()
+        fig.savefig(buf, format='PNG', pad_inches=0, transparent=True)  # Kein bbox_inches hier
+        plt.close(fig)
+    buf.seek(0)
+    curve_img = Image.open(buf).convert("RGBA")
+
+    # Automatisch alle außen liegenden transparenten Pixel abschneiden
+    return curve_img.crop(curve_img.getbbox())
+
+
+def _coverage(top, bottom, first_row, last_row):
+    # Anteil der Pixelzeilen first_row..last_row-1, der zwischen top und bottom
+    # liegt (Pixelkoordinaten je Spalte, top <= bottom); ergibt die vertikale
+    # Kantenglättung
+    rows = np.arange(first_row, last_row, dtype=np.float32)[:, None]
+    return np.clip(np.minimum(bottom, rows + 1) - np.maximum(top, rows), 0, 1)
+
+
+def render_curve_raster(temperatures, rain, monat, width, height, supersample=SUPERSAMPLE):
+    # Regen- und Temperaturkurve direkt in ein RGBA-Array in Zielgröße rastern,
+    # ohne Figure, PNG-Umweg, Zuschneiden und Skalieren. Geometrie wie bei
+    # render_curve nach crop + resize: erste bis letzte Stunde über die ganze
+    # Breite, y von 0 (unten) bis Y_MAX (oben) über die ganze Höhe.
+    x = np.arange(len(temperatures))
+    hours = (np.arange(width * supersample) + 0.5) / (width * supersample) * x[-1]
+    temp_y = interp1d(x, temperatures, kind='cubic')(hours)
+    rain_y = PchipInterpolator(x, rain)(hours)
+
+    def to_px(y):
+        return ((1 - y / Y_MAX) * height).astype(np.float32)
+
+    def band(y0, y1):
+        # Abdeckung (height × width), Mittel über die Unterabtastung einer Spalte
+        top = to_px(np.maximum(y0, y1)).reshape(width, supersample)
+        bottom = to_px(np.minimum(y0, y1)).reshape(width, supersample)
+        cov = np.zeros((height, width), dtype=np.float32)
+        # nur die Zeilen anfassen, die die Fläche überhaupt erreicht
+        first_row = min(max(int(np.floor(top.min())), 0), height)
+        last_row = min(max(int(np.ceil(bottom.max())), first_row), height)
+        for k in range(supersample):
+            cov[first_row:last_row] += _coverage(top[:, k], bottom[:, k], first_row, last_row)
+        return cov / np.float32(supersample)
+
+    rain_a = band(RAIN_BASE, RAIN_BASE + rain_y * RAIN_SCALE) * RAIN_ALPHA
+    temp_a = band(TEMP_BASE, TEMP_BASE + temp_y * TEMP_SCALE) * TEMP_ALPHA
+
+    # Farbe der Temperaturfläche je Pixelspalte aus Colormap 'rainbow'
+    temp_rgb = colormaps['rainbow'](temperature_norm(monat)(temp_y))[:, :3]
+    temp_rgb = temp_rgb.reshape(width, supersample, 3).mean(axis=1).astype(np.float32)
+
+    # Temperatur über Regen: Farbe ist die Mischung aus beiden nach dem
+    # Anteil der Temperaturfläche am gesamten Alpha
+    alpha = temp_a + rain_a * (1 - temp_a)
+    share = np.divide(temp_a, alpha, out=np.zeros_like(alpha), where=alpha > 0)
+    rain_rgb = np.array(RAIN_RGB, dtype=np.float32) * 255
+    rgb = share[..., None] * (temp_rgb * 255 - rain_rgb)[None] + rain_rgb
+
+    rgba = np.empty((height, width, 4), dtype=np.uint8)
+    rgba[..., :3] = rgb + 0.5
+    rgba[..., 3] = alpha * 255 + 0.5
+    return Image.fromarray(rgba, "RGBA")
+
+
+# ------------------ Sprite-Cache ------------------
+# Icons, gedrehte Windpfeile und Bewölkungskreise werden pro Prozess einmal
+# erzeugt und dann für alle Stationen, Reihen und Widget-Größen nur noch
+# eingefügt. Windrichtung auf ganze Grad, Bewölkung auf ganze Prozent gerundet.
+
+@lru_cache(maxsize=None)
+def icon(path, size):
+    # path: Icon-Datei, size: (Breite, Höhe) im Zielbild
+    with Image.open(path) as img:
+        return img.convert("RGBA").resize(size)
+
+
+@lru_cache(maxsize=None)
+def _rotated_arrow(path, size, angle):
+    # Icon für windrichtung zeigt ursprünglich nach rechts (Osten)
+    return icon(path, size).rotate(angle + 90, expand=True)  # expand=True sorgt dafür, dass nichts abgeschnitten wird
+
+
+def wind_arrow(path, size, wind_dir_deg):
+    return _rotated_arrow(path, size, int(round(wind_dir_deg)) % 360)
+
+
+@lru_cache(maxsize=None)
+def _cloud_pie(percentage, size, fill_color="darkgrey", outline_color="black"):
+    img = Image.new("RGBA", (size, size), "rgba(0,0,0,0)")
+    draw = ImageDraw.Draw(img)
+
+    # Define bounding box for the circle
+    bbox = [0, 0, size-1, size-1]
+
+    # Calculate angle
+    start_angle = -90  # Start from top (12 o'clock)
+    end_angle = start_angle + (percentage / 100) * 360
+
+    # Draw filled arc (pieslice)
+    draw.pieslice(bbox, start=start_angle, end=end_angle, fill=fill_color)
+
+    # Optional: draw circle outline
+    draw.ellipse(bbox, outline=outline_color)
+
+    return img
+
+
+def cloud_pie(percentage, size):
+    # Fehlender Wert (NaN) wird wie wolkenlos gezeichnet
+    return _cloud_pie(int(round(percentage)) if percentage == percentage else 0, size)
+
+
+def warm_sprites(arrow_path, arrow_sizes, pie_sizes):
+    # Alle Windpfeile und Bewölkungskreise vorab erzeugen, z.B. einmal pro
+    # Worker-Prozess, damit beim Rendern nur noch Cache-Treffer anfallen
+    for size in arrow_sizes:
+        for angle in range(360):
+            _rotated_arrow(arrow_path, size, angle)
+    for size in pie_sizes:
+        for percentage in range(101):
+            _cloud_pie(percentage, size)
@@ -0,0 +1,278 @@
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import dwd_download
+import main48
+import mosmix_store
+import widget_encode
+
+# Lokaler HTTP-Dienst für einzelne Widgets:
+#   GET /widget?station=<ID oder Name>&profile=small|large
+#   GET /widget?lat=<Grad>&lon=<Grad>&profile=small|large   (nächste Station)
+#   GET /status
+# Gerendert wird mit denselben Stufen wie main48. Die kodierten Bilder liegen
+# in einem LRU-Cache mit Schlüssel (Station, MOSMIX_S-Lauf, Profil); sobald
+# ein neuerer Lauf abgelegt ist, fallen alle Einträge älterer Läufe heraus.
+# Für Tests ohne Netz: --kmz-s und --kmz-l-dir mit Fixture-KMZs.
+
+HOST = "127.0.0.1"
+PORT = 8048
+
+CACHE_SIZE = 256  # Bilder
+PROFILES = ("small", "large")
+DEFAULT_PROFILE = "large"
+
+# Abfrageintervall für neue MOSMIX_S-Läufe (Sekunden)
+REFRESH_INTERVAL = 300
+
+
+class StationNotFound(Exception):
+    # Station weder als ID noch als Name im aktuellen Lauf → 404
+    pass
+
+
+class NoRunLoaded(Exception):
+    # Noch kein MOSMIX_S-Lauf geladen → 503
+    pass
+
+
+class WidgetCache:
+    # LRU über kodierte Widgets; Schlüssel (Stations-ID, Lauf, Profil)
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def keep_run(self, run):
+        # Alle Einträge anderer Läufe entfernen
+        with self._lock:
+            for key in [k for k in self._entries if k[1] != run]:
+                del self._entries[key]
+
+
+class WidgetService:
+    # Hält den aktuellen MOSMIX_S-Lauf samt Sonnentabelle und rendert Widgets auf Anfrage
+
+    def __init__(self, url=main48.URL_MOSMIX_S, kmz_s=None, kmz_l_dir=None, encoder=None,
+                 curve_backend="raster", cache_size=CACHE_SIZE):
+        self.url = url
+        self.kmz_s = kmz_s
+        self.kmz_l_dir = Path(kmz_l_dir) if kmz_l_dir else None
+        self.encoder = encoder or widget_encode.encoder_from_spec(main48.WIDGET_ENCODER)
+        self.curve_backend = curve_backend
+        self.cache = WidgetCache(cache_size)
+        self.current = None  # (MosmixRun, SunTable)
+        self._lock = threading.Lock()
+        self._station_locks = {}
+
+    def refresh(self):
+        # Neuesten Lauf ablegen; True, wenn sich der Lauf geändert hat
+        if self.kmz_s is not None:
+            run = mosmix_store.open_run(mosmix_store.ingest_kmz(self.kmz_s, "MOSMIX_S"))
+        else:
+            _, run = main48.fetch_mosmix_s(self.url)
+            if run is None:
+                return False
+        with self._lock:
+            if self.current is not None and self.current[0].run == run.run:
+                return False
+            self.current = (run, main48.sun_times_for_run(run))
+        self.cache.keep_run(run.run)
+        print(f"MOSMIX_S {run.run} geladen, {len(run.stations)} Stationen")
+        return True
+
+    def refresh_forever(self, interval=REFRESH_INTERVAL):
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Fehler beim Laden des neuen Laufs: {e}")
+
+    def resolve(self, run, station=None, lat=None, lon=None):
+        # Stationsdatensatz über ID/Name oder als nächste Station zu lat/lon
+        if station is not None:
+            try:
+                return run.station(station)
+            except KeyError as e:
+                raise StationNotFound(str(e).strip("'\"")) from None
+        return run.index.nearest(lat, lon)[0]
+
+    def _mosmix_l_path(self, station_id):
+        if self.kmz_l_dir is not None:
+            return self.kmz_l_dir / f"MOSMIX_L_LATEST_{station_id}.kmz"
+        return dwd_download.fetch(main48.mosmix_l_url(station_id)).path
+
+    def _station_lock(self, station_id):
+        with self._lock:
+            return self._station_locks.setdefault(station_id, threading.Lock())
+
+    def _render(self, run, sun_times, station_id):
+        # Beide Profile einer Station; dict Profil → Bytes
+        import widget_layout
+
+        df_s = main48.parse_kml_forecast_for_station_mosmix_s(run, station_id)[0]
+        run_mosmix_l = mosmix_store.open_run(
+            mosmix_store.ingest_kmz(self._mosmix_l_path(station_id), f"MOSMIX_L_{station_id}"))
+        df_1, df_2 = main48.merge_forecasts(df_s, run_mosmix_l)
+        widgets = widget_layout.render_widgets(df_1, df_2, sun_times.station(station_id),
+                                               curve_backend=self.curve_backend)
+        return {profile: widget_encode.encode(img, self.encoder)[0] for profile, img in zip(PROFILES, widgets)}
+
+    def widget(self, profile=DEFAULT_PROFILE, station=None, lat=None, lon=None):
+        # Liefert (Bytes, Stationsdatensatz, Lauf, aus dem Cache ja/nein).
+        # StationNotFound, wenn die Station nicht im Lauf ist; NoRunLoaded ohne geladenen Lauf
+        if self.current is None:
+            raise NoRunLoaded("Noch kein MOSMIX_S-Lauf geladen")
+        run, sun_times = self.current
+        record = self.resolve(run, station, lat, lon)
+        station_id = record["station_id"]
+        key = (station_id, run.run, profile)
+        data = self.cache.get(key)
+        if data is not None:
+            return data, record, run.run, True
+
+        # Gleichzeitige Anfragen derselben Station rendern nur einmal
+        with self._station_lock(station_id):
+            data = self.cache.get(key)
+            if data is not None:
+                return data, record, run.run, True
+            rendered = self._render(run, sun_times, station_id)
+            # Ist inzwischen ein neuerer Lauf da, nicht mehr in den Cache legen
+            if self.current[0].run == run.run:
+                for name, encoded in rendered.items():
+                    self.cache.put((station_id, run.run, name), encoded)
+        return rendered[profile], record, run.run, False
+
+    def status(self):
+        run = self.current[0].run if self.current is not None else None
+        return {"run": run, "cached": len(self.cache), "hits": self.cache.hits, "misses": self.cache.misses,
+                "encoder": f"{self.encoder.name}:{self.encoder.level}"}
+
+
+def make_handler(service):
+    class WidgetHandler(BaseHTTPRequestHandler):
+
+        def _send(self, status, body, content_type, headers=()):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/status":
+                body = json.dumps(service.status()).encode("utf-8")
+                return self._send(200, body, "application/json")
+            if url.path != "/widget":
+                return self.send_error(404)
+
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            profile = query.get("profile", DEFAULT_PROFILE)
+            if profile not in PROFILES:
+                return self.send_error(400, f"profile muss {' oder '.join(PROFILES)} sein")
+            try:
+                lat = float(query["lat"]) if "lat" in query else None
+                lon = float(query["lon"]) if "lon" in query else None
+            except ValueError:
+                return self.send_error(400, "lat/lon müssen Zahlen sein")
+            station = query.get("station")
+            if station is None and (lat is None or lon is None):
+                return self.send_error(400, "station oder lat und lon angeben")
+
+            try:
+                data, record, run, cached = service.widget(profile, station=station, lat=lat, lon=lon)
+            except StationNotFound as e:
+                return self.send_error(404, str(e))
+            except NoRunLoaded as e:
+                return self.send_error(503, str(e))
+            except Exception as e:
+                # Auch ein KeyError aus merge_forecasts/Rendern (z.B. fehlendes Element) ist ein
+                # Serverfehler und kein "Station nicht gefunden"
+                print(f"Fehler beim Rendern: {type(e).__name__}: {e}")
+                return self.send_error(500, "Widget konnte nicht erzeugt werden")
+
+            etag = f'"{record["station_id"]}-{run}-{profile}-{service.encoder.name}{service.encoder.level}"'
+            headers = [("ETag", etag), ("X-Station-ID", record["station_id"]), ("X-Mosmix-Run", run),
+                       ("X-Cache", "HIT" if cached else "MISS")]
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                for name, value in headers:
+                    self.send_header(name, value)
+                return self.end_headers()
+            self._send(200, data, service.encoder.mime, headers)
+
+    return WidgetHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokaler HTTP-Dienst für Wetter-Widgets einzelner MOSMIX-Stationen")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="Anzahl Bilder im LRU-Cache")
+    parser.add_argument("--encoder", default=main48.WIDGET_ENCODER, help="Ausgabeformat, siehe widget_encode")
+    parser.add_argument("--curve-backend", default="raster", choices=("raster", "matplotlib"))
+    parser.add_argument("--interval", type=int, default=REFRESH_INTERVAL, help="Sekunden zwischen zwei Abfragen auf einen neuen Lauf")
+    parser.add_argument("--kmz-s", type=Path, help="MOSMIX_S aus dieser Datei statt vom DWD (offline)")
+    parser.add_argument("--kmz-l-dir", type=Path, help="Verzeichnis mit MOSMIX_L_LATEST_<ID>.kmz statt Download (offline)")
+    args = parser.parse_args()
+
+    try:
+        encoder = widget_encode.encoder_from_spec(args.encoder)
+    except ValueError as e:
+        parser.error(str(e))
+
+    service = WidgetService(kmz_s=args.kmz_s, kmz_l_dir=args.kmz_l_dir, encoder=encoder,
+                            curve_backend=args.curve_backend, cache_size=args.cache_size)
+    if not service.refresh():
+        parser.exit(1, "MOSMIX_S konnte nicht geladen werden\n")
+
+    # Fonts, Colormaps und Sprites vor der ersten Anfrage laden
+    import widget_pool
+    widget_pool.warm_up()
+
+    threading.Thread(target=service.refresh_forever, args=(args.interval,), daemon=True).start()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Widgets unter http://{args.host}:{args.port}/widget?station=<ID>&profile=small|large")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()